@@ -6,28 +6,27 @@ import time
 import os
 import logging
 import json
+import asyncio
+import random
+import re
+import signal
+import subprocess
+import hmac
+import copy
+import queue
+import atexit
+import logging.handlers
 
-import socketserver
-from http.server import BaseHTTPRequestHandler
-from threading import Thread
-from datetime import datetime
-
-# --- Selenium Imports ---
-try:
-    from selenium import webdriver
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from selenium.common.exceptions import TimeoutException, NoSuchElementException
-    from selenium.webdriver.firefox.options import Options as FirefoxOptions
-    from selenium.webdriver.firefox.service import Service as FirefoxService
-except ImportError:
-    print("ERROR: Selenium library not found. Please install: pip install selenium")
-    sys.exit(1)
-# --- End Selenium Imports ---
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock, Event
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, urljoin, parse_qs
+from html.parser import HTMLParser
 
 try:
     # Adjust these imports if your library structure is different
+    import requests  # installed with PyTado
     from PyTado.interface import Tado
     from PyTado.http import DeviceActivationStatus
     from PyTado.exceptions import TadoException, TadoCredentialsException
@@ -42,62 +41,1127 @@ log_handler.setFormatter(log_formatter)
 logger = logging.getLogger("TadoAA")
 logger.addHandler(log_handler)
 logger.setLevel(logging.INFO)
+logQueueHandler = None
+LOG_FIELDS = ("home", "cycle", "zone", "devices", "mode", "action")
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with stable keys; LOG_FIELDS not given by the call are null."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            entry[field] = getattr(record, field, None)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a bounded queue: drops records instead of blocking when it is full."""
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The base class folds the traceback into msg; keep exc_info so the formatter
+        # of the stdout handler (e.g. the JSON "exc" field) sees the same record as in sync mode
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # emit() runs under the handler lock
+            self.dropped += 1
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room in a full queue instead of failing."""
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+def setup_logging(queue_size: int = 0, json_format: bool = False):
+    """
+    Switches to the JSON formatter and/or queue-backed logging: records go into a
+    bounded queue and a background listener writes them to stdout, so a slow log
+    pipeline cannot stall the engine threads.
+    """
+    global logQueueHandler
+    if json_format:
+        log_handler.setFormatter(JsonFormatter())
+    if queue_size > 0 and logQueueHandler is None:
+        logQueueHandler = DroppingQueueHandler(queue.Queue(queue_size))
+        listener = DrainingQueueListener(logQueueHandler.queue, log_handler)
+        logger.removeHandler(log_handler)
+        logger.addHandler(logQueueHandler)
+        listener.start()
+        atexit.register(listener.stop)
+
+class HomeLogger(logging.LoggerAdapter):
+    """Adds the home name and current cycle ID to every record logged for a home."""
+    def process(self, msg, kwargs):
+        extra = {"home": self.extra.name or None, "cycle": self.extra.cycleId}
+        extra.update(kwargs.get("extra") or {})
+        kwargs["extra"] = extra
+        return msg, kwargs
 
 # --- Global Variables ---
-t: Tado | None = None
-token_file_path: str | None = None
 checkingInterval: float = 10.0
 errorRetringInterval: float = 30.0
-lastMessage: str = ""
-tado_username: str | None = None
-tado_password: str | None = None
+lastMessages: dict[str, str] = {}
+batchZoneStates: bool = True
+zoneWorkers: int = 1
+dailyCallBudget: int = 0
+approvalTimeout: float = 180.0
+approvalEngine: str = "auto"
+browserTimeout: float = 20.0
+browserScreenshots: bool = False
+callTiming: bool = False
+cacheTtls: dict[str, float] = {"zones": 3600.0}
+sessionReuse: bool = True
+tokenRefreshMargin: float = 120.0
+stateMaxAge: float = 300.0
+backoffMax: float = 600.0
+breakerThreshold: int = 5
+breakerCooldown: float = 60.0
+triggerSecret: str | None = None
+triggerMinInterval: float = 5.0
+presenceSamples: int = 2
+presenceDwell: float = 0.0
+presenceCooldown: float = 60.0
+traceFile = None
+traceLock = Lock()
+printLock = Lock()
+approvalLock = Lock()
+
+# --- API Request Budget ---
+ENDPOINT_ID = re.compile(r"/\d+(?=/|$)")
+RATELIMIT_PARAM = re.compile(r"\b([qrtw])=(\d+)")
+BUDGET_RESERVE = 0.05  # share of the quota kept back for writes and re-initialization
+
+class ApiBudget:
+    """
+    Counts Tado API requests per endpoint and works out how long the monitoring loop
+    must wait so that a daily call budget (and the quota Tado reports in its
+    RateLimit headers) lasts until it resets. 429 responses block polling for the
+    Retry-After period. With a daily budget, the day's count is kept in path so a
+    restart (or crash loop) does not start the day over at zero.
+    """
+    def __init__(self, daily_budget: int = 0, path: str | None = None):
+        self.daily_budget = daily_budget
+        self.path = path if daily_budget > 0 else None
+        self.lock = Lock()
+        self.endpoints: dict[str, int] = {}
+        self.day = 0
+        self.used_today = 0
+        self.saved = (0, 0)
+        self.quota: int | None = None
+        self.quota_remaining: int | None = None
+        self.quota_reset_at: float | None = None
+        self.blocked_until = 0.0
+        self.interval = checkingInterval
+        self.load()
+
+    def load(self):
+        """Restores today's count from path, if it was saved today."""
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            day, used = int(saved["day"]), int(saved["used_today"])
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring budget file {self.path}: {e}")
+            return
+        if day == int(time.time() // 86400):
+            self.day, self.used_today = day, used
+            self.saved = (day, used)
+            logger.info(f"Restored {used} API calls made today from {self.path}.")
+
+    def save(self):
+        """Writes today's count to path when it changed. Called under self.lock."""
+        if not self.path or self.saved == (self.day, self.used_today):
+            return
+        try:
+            write_json_atomic(self.path, {"day": self.day, "used_today": self.used_today})
+            self.saved = (self.day, self.used_today)
+        except OSError as e:
+            logger.warning(f"Cannot save budget file {self.path}: {e}")
+
+    def observe(self, t):
+        """Wraps the transport adapters of t's HTTP session so every response is recorded."""
+        session = getattr(getattr(t, "_http", None), "_session", None)
+        if session is None:
+            return
+        for adapter in set(session.adapters.values()):
+            if getattr(adapter, "_tadoaa_budget", None) is self:
+                continue
+            def counted_send(request, *args, _send=adapter.send, **kwargs):
+                response = _send(request, *args, **kwargs)
+                self.record(request.url, response.status_code, response.headers)
+                return response
+            adapter.send = counted_send
+            adapter._tadoaa_budget = self
+
+    def _roll(self, now: float):
+        day = int(now // 86400)
+        if day != self.day:
+            self.day = day
+            self.used_today = 0
+
+    def record(self, url: str, status_code: int, headers):
+        """Counts one response and picks up rate-limit information from its headers."""
+        endpoint = ENDPOINT_ID.sub("/{id}", urlsplit(url).path)
+        now = time.time()
+        with self.lock:
+            self._roll(now)
+            self.used_today += 1
+            self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+            policy = dict(RATELIMIT_PARAM.findall(headers.get("RateLimit-Policy", "")))
+            limit = dict(RATELIMIT_PARAM.findall(headers.get("RateLimit", "")))
+            if "q" in policy:
+                self.quota = int(policy["q"])
+            if "r" in limit:
+                self.quota_remaining = int(limit["r"])
+                self.quota_reset_at = now + int(limit.get("t", policy.get("w", 86400)))
+            if status_code == 429:
+                retry_after = headers.get("Retry-After", "")
+                wait = int(retry_after) if retry_after.isdigit() else errorRetringInterval
+                self.blocked_until = max(self.blocked_until, now + wait)
+
+    @staticmethod
+    def _spread(remaining: float, seconds_left: float, calls_per_cycle: int) -> float:
+        """Interval that makes the remaining calls last until the window resets."""
+        if remaining <= calls_per_cycle:
+            return seconds_left
+        return seconds_left * calls_per_cycle / remaining
+
+    def next_interval(self, calls_per_cycle: int) -> float:
+        """Returns the wait before the next cycle: checkingInterval, stretched to fit the budget."""
+        now = time.time()
+        calls_per_cycle = max(1, calls_per_cycle)
+        with self.lock:
+            self._roll(now)
+            interval = checkingInterval
+            if self.daily_budget > 0:
+                remaining = self.daily_budget * (1 - BUDGET_RESERVE) - self.used_today
+                interval = max(interval, self._spread(remaining, (self.day + 1) * 86400 - now, calls_per_cycle))
+            if self.quota_remaining is not None and self.quota_reset_at and self.quota_reset_at > now:
+                remaining = self.quota_remaining - (self.quota or 0) * BUDGET_RESERVE
+                interval = max(interval, self._spread(remaining, self.quota_reset_at - now, calls_per_cycle))
+            interval = max(interval, self.blocked_until - now)
+            self.interval = interval
+            self.save()
+            return interval
+
+    def retry_interval(self, delay: float | None = None) -> float:
+        """Returns the wait after an error (delay, default errorRetringInterval), at least until a 429 block expires."""
+        with self.lock:
+            # Also reached by failing (re)initializations that never complete a cycle
+            self.save()
+            return max(errorRetringInterval if delay is None else delay, self.blocked_until - time.time())
+
+    def stats(self) -> dict:
+        """Budget usage for logs and the health server."""
+        with self.lock:
+            return {
+                "daily_budget": self.daily_budget or None,
+                "used_today": self.used_today,
+                "quota": self.quota,
+                "quota_remaining": self.quota_remaining,
+                "interval": round(self.interval, 1),
+                "endpoints": dict(self.endpoints),
+            }
+
+# --- Retry Policy ---
+BREAKER_GROUPS = ("owd", "presence", "auth")
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+class Backoff:
+    """
+    Exponential backoff with decorrelated jitter: every wait is drawn between
+    errorRetringInterval and three times the previous wait (capped at backoffMax),
+    so replicas that failed together do not retry in lockstep.
+    """
+    def __init__(self):
+        self.delay = 0.0
+
+    def next(self) -> float:
+        base = errorRetringInterval
+        self.delay = min(backoffMax, random.uniform(base, max(base, self.delay * 3)))
+        return self.delay
+
+    def reset(self):
+        self.delay = 0.0
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one endpoint group (owd, presence, auth) of a home. After
+    breakerThreshold consecutive failures the group is skipped (open) for
+    breakerCooldown seconds, doubled after every failed probe up to backoffMax. Then
+    a single call is let through (half-open); its result closes or reopens the breaker.
+    """
+    def __init__(self, home: "TadoHome", group: str):
+        self.home = home
+        self.group = group
+        self.lock = Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.cooldown = 0.0
+        self.open_until = 0.0
+        self.probing = False
+
+    def allow(self) -> bool:
+        """True if a call may go out now; in half-open state only one probe at a time."""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() >= self.open_until:
+                self.state = "half_open"
+                self.probing = False
+                self.home.logger.info(f"Circuit {self.group} half-open. Probing...")
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def remaining(self) -> float:
+        """Seconds until an open breaker lets a probe through."""
+        with self.lock:
+            return max(0.0, self.open_until - time.monotonic()) if self.state == "open" else 0.0
+
+    def success(self):
+        with self.lock:
+            if self.state != "closed":
+                self.home.logger.info(f"Circuit {self.group} closed.")
+            self.state = "closed"
+            self.failures = 0
+            self.cooldown = 0.0
+            self.probing = False
+
+    def release(self):
+        """Ends a probe that neither succeeded nor failed (e.g. an auth error elsewhere)."""
+        with self.lock:
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if breakerThreshold <= 0:
+                return
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= breakerThreshold):
+                self.cooldown = min(backoffMax, self.cooldown * 2 if self.cooldown else breakerCooldown)
+                self.open_until = time.monotonic() + self.cooldown
+                self.state = "open"
+                self.home.count("tado_breaker_trips_total", label=self.group)
+                self.home.logger.warning(f"Circuit {self.group} open after {self.failures} failure(s). "
+                                         f"Next probe in {self.cooldown:.0f}s.")
+
+    def stats(self) -> dict:
+        """Breaker state for the health server."""
+        with self.lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "retry_in": round(max(0.0, self.open_until - time.monotonic()), 1) if self.state == "open" else None,
+            }
+
+def run_guarded(home: "TadoHome", group: str, func, errors: list, default=None):
+    """
+    Runs func() for an endpoint group whose breaker already allowed it. Tado and
+    response errors are recorded on the breaker and appended to errors as (group, e)
+    instead of raised, so the other groups keep working; auth errors propagate.
+    """
+    breaker = home.breakers[group]
+    try:
+        result = func()
+    except TadoCredentialsException:
+        breaker.release()
+        raise
+    except (TadoException, KeyError) as e:
+        breaker.failure()
+        errors.append((group, e))
+        return default
+    except Exception:
+        # e.g. requests' ConnectionError: settle a half-open probe before propagating
+        breaker.failure()
+        raise
+    breaker.success()
+    return result
+
+def retry_delay(home: "TadoHome", group: str | None = None) -> float:
+    """Wait before a retry: the next backoff step, at least until a 429 block and the group's open breaker expire."""
+    delay = home.budget.retry_interval(home.backoff.next())
+    if group is not None:
+        delay = max(delay, home.breakers[group].remaining())
+    return delay
+
+# --- Presence Debounce ---
+class PresenceDebouncer:
+    """
+    Hysteresis for HOME/AWAY writes. The mode wanted by the devices (any device at
+    home -> HOME, none -> AWAY) is only written after it has disagreed with Tado's
+    mode for presenceSamples consecutive polls and for presenceDwell seconds, and
+    not within presenceCooldown seconds of the previous write. Each poll that holds
+    back a write is counted by reason.
+    """
+    def __init__(self, home: "TadoHome"):
+        self.home = home
+        self.pending: str | None = None
+        self.samples = 0
+        self.since = 0.0
+        self.last_write: float | None = None
+
+    def decide(self, mode: str, devices_home: list[str]) -> str | None:
+        """Returns the mode to write now, or None."""
+        target = "HOME" if devices_home else "AWAY"
+        if mode == target:
+            self.pending = None
+            self.samples = 0
+            return None
+        now = time.monotonic()
+        if target != self.pending:
+            self.pending, self.samples, self.since = target, 0, now
+        self.samples += 1
+        if self.samples < presenceSamples or now - self.since < presenceDwell:
+            reason = "debounce"
+        elif self.last_write is not None and now - self.last_write < presenceCooldown:
+            reason = "cooldown"
+        else:
+            return target
+        self.home.count("tado_presence_writes_suppressed_total", label=reason)
+        return None
+
+    def written(self):
+        self.last_write = time.monotonic()
+        self.pending = None
+        self.samples = 0
+
+    def status(self) -> str:
+        """Describes a switch being confirmed, for the presence log line."""
+        if self.pending is None:
+            return ""
+        return f" {self.pending} pending ({self.samples}/{presenceSamples})."
+
+# --- API Call Instrumentation ---
+CALL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class TracedTado:
+    """
+    Wraps a Tado object so every method call the app makes is timed and recorded:
+    a latency histogram and result counts per method on the home (read by the
+    health server) and, with TADO_TRACE_FILE, one JSON line per call. Only
+    installed when TADO_CALL_TIMING or TADO_TRACE_FILE is set, so it costs
+    nothing when disabled.
+    """
+    __slots__ = ("_tado", "_home", "_wrapped")
+
+    def __init__(self, tado, home: "TadoHome"):
+        object.__setattr__(self, "_tado", tado)
+        object.__setattr__(self, "_home", home)
+        object.__setattr__(self, "_wrapped", {})
+
+    def __getattr__(self, name: str):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attr = getattr(self._tado, name)
+        if not callable(attr):
+            return attr
+        home = self._home
+
+        def traced(*args, **kwargs):
+            started = time.perf_counter()
+            result = "ok"
+            try:
+                return attr(*args, **kwargs)
+            except BaseException as e:
+                result = e.__class__.__name__
+                raise
+            finally:
+                home.record_call(name, time.perf_counter() - started, result)
+
+        self._wrapped[name] = traced
+        return traced
+
+    def __setattr__(self, name: str, value):
+        setattr(self._tado, name, value)
+
+def write_trace(record: dict):
+    """Appends one JSON line to the trace file."""
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with traceLock:
+        try:
+            traceFile.write(line)
+            traceFile.flush()
+        except (OSError, ValueError) as e:
+            logger.debug(f"Trace write failed: {e}")
+
+# --- Session Reuse ---
+TOKEN_RECOVERY_ATTEMPTS = 3  # consecutive auth errors recovered in place before a full re-init
+
+def keep_session(home: "TadoHome"):
+    """
+    Adapts the PyTado HTTP layer of home.t to a long-running process: token refreshes
+    keep the pooled keep-alive connections (PyTado closes and recreates its session
+    on every refresh) and the token file is replaced atomically, so a crash mid-write
+    never leaves a truncated token behind.
+    """
+    http = getattr(home.t, "_http", None)
+    session = getattr(http, "_session", None)
+    if session is None or getattr(http, "_tadoaa_keep", False):
+        return
+    if hasattr(http, "_create_session"):
+        session.close = lambda: None
+        http._create_session = lambda: session
+    if hasattr(http, "_save_token"):
+        http._save_token = lambda: save_token_atomic(http)
+    http._tadoaa_keep = True
+
+def write_json_atomic(path: str, data):
+    """Writes data to a temporary file and renames it over path."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_token_atomic(http):
+    """Atomic replacement for PyTado's Http._save_token()."""
+    path = http._token_file_path
+    if not path or not http._token_refresh:
+        return
+    try:
+        write_json_atomic(path, {"refresh_token": http._token_refresh})
+    except OSError as e:
+        logger.error(f"Failed to save refresh token: {e}")
+        raise TadoException(e) from e
+
+def close_session(home: "TadoHome"):
+    """Drops home.t and really closes its pooled connections."""
+    session = getattr(getattr(home.t, "_http", None), "_session", None)
+    if session is not None:
+        try:
+            requests.Session.close(session)
+        except Exception as e:
+            home.logger.debug(f"Closing session failed: {e}")
+    home.t = None
+
+def refresh_session(home: "TadoHome", force: bool = False) -> bool:
+    """
+    Refreshes the access token when it expires within tokenRefreshMargin (or when forced),
+    between cycles instead of in the middle of one. Returns False when Tado rejected the
+    refresh token; connection errors raise TadoException.
+    """
+    http = getattr(home.t, "_http", None)
+    refresh_at = getattr(http, "_refresh_at", None)
+    if refresh_at is None or not hasattr(http, "_refresh_token"):
+        # Unknown PyTado internals: PyTado refreshes on its own, a forced refresh is impossible
+        return not force
+    if not force and refresh_at - datetime.now(timezone.utc) > timedelta(seconds=tokenRefreshMargin):
+        return True
+    try:
+        refreshed = http._refresh_token(force_refresh=True)
+    except TadoException:
+        home.count("tado_token_refreshes_total", label="error")
+        home.breakers["auth"].failure()
+        raise
+    home.count("tado_token_refreshes_total", label="ok" if refreshed else "rejected")
+    if refreshed:
+        home.breakers["auth"].success()
+    else:
+        home.breakers["auth"].failure()
+    return bool(refreshed)
+
+def recover_session(home: "TadoHome") -> bool:
+    """
+    Handles an auth error without rebuilding the Tado object: forces a token refresh on
+    the existing session. Returns False only when the refresh token was rejected, i.e.
+    when the full device flow is needed.
+    """
+    started = time.perf_counter()
+    try:
+        recovered = refresh_session(home, force=True)
+    except TadoException as e:
+        home.logger.warning(f"Token refresh failed: {e}. Keeping the session.")
+        time.sleep(retry_delay(home, "auth"))
+        return True
+    if recovered:
+        home.count("tado_session_recoveries_total", label="in_place")
+        home.publish(last_recovery_seconds=round(time.perf_counter() - started, 3))
+        printm(f"Auth error recovered in place ({(time.perf_counter() - started) * 1000:.0f} ms).", home)
+    else:
+        home.count("tado_session_recoveries_total", label="reinit")
+    return recovered
+
+# --- Metadata Cache ---
+class MetadataCache:
+    """
+    TTL cache for slow-changing Tado metadata (e.g. the zone list), so the loop only
+    fetches volatile data every cycle. TTLs per endpoint come from cacheTtls
+    (TADO_CACHE_TTL); endpoints without a TTL are never cached.
+    """
+    def __init__(self, home: "TadoHome"):
+        self.home = home
+        self.entries: dict[str, tuple[float, object]] = {}
+        self.lock = Lock()
+
+    def put(self, endpoint: str, value, age: float = 0.0):
+        """Stores a value fetched age seconds ago (e.g. restored from the warm-restart state)."""
+        ttl = cacheTtls.get(endpoint, 0) - age
+        if ttl > 0:
+            with self.lock:
+                self.entries[endpoint] = (time.monotonic() + ttl, value)
+
+    def get(self, endpoint: str, fetch) -> tuple[object, bool]:
+        """Returns (value, cache hit) for endpoint, calling fetch() when missing or expired."""
+        ttl = cacheTtls.get(endpoint, 0)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(endpoint)
+        if entry is not None and now < entry[0]:
+            self.home.count("tado_cache_hits_total", label=endpoint)
+            return entry[1], True
+        value = fetch()
+        self.home.count("tado_cache_misses_total", label=endpoint)
+        if ttl > 0:
+            with self.lock:
+                self.entries[endpoint] = (now + ttl, value)
+        return value, False
+
+    def invalidate(self, endpoint: str | None = None):
+        """Drops one endpoint, or everything, so the next get() fetches again."""
+        with self.lock:
+            if endpoint is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(endpoint, None)
+
+    def stats(self) -> dict:
+        """Hits, misses and hit rate per endpoint."""
+        with self.home.lock:
+            counters = dict(self.home.metrics)
+        stats = {}
+        for (metric, endpoint), value in counters.items():
+            if metric in ("tado_cache_hits_total", "tado_cache_misses_total"):
+                entry = stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+                entry["hits" if metric == "tado_cache_hits_total" else "misses"] = int(value)
+        for entry in stats.values():
+            entry["hit_rate"] = round(entry["hits"] / max(1, entry["hits"] + entry["misses"]), 3)
+        return stats
+
+# --- Zone and Device Records ---
+class ZoneRecord:
+    """OWD state of one zone, updated in place from each zoneStates payload."""
+    __slots__ = ("id", "name", "detected", "active")
+
+    def __init__(self, zone_id, name: str):
+        self.id = zone_id
+        self.name = name
+        # Unknown until the first payload, so that one always counts as a change
+        self.detected: bool | None = None
+        self.active: bool | None = None
+
+class DeviceRecord:
+    """Geofencing state of one mobile device, updated in place from each mobileDevices payload."""
+    __slots__ = ("id", "name", "tracked", "located", "at_home")
+
+    def __init__(self, device_id, name: str):
+        self.id = device_id
+        self.name = name
+        self.tracked = False
+        self.located = False
+        self.at_home = False
+
+def index_zones(home: "TadoHome", zones: list) -> dict:
+    """
+    Returns the ZoneRecords of the zone list keyed by the string ID zoneStates uses.
+    Rebuilt only when the (cached) zone list object changes.
+    """
+    if zones is home.zoneList:
+        return home.zoneRecords
+    records = {}
+    for z in zones:
+        zoneID = z.get("id")
+        if not zoneID:
+             home.logger.warning("Zone with no ID.")
+             continue
+        name = z.get("name", f"Zone {zoneID}")
+        record = home.zoneRecords.get(str(zoneID))
+        if record is None:
+             record = ZoneRecord(zoneID, name)
+        record.name = name
+        records[str(zoneID)] = record
+    home.zoneList, home.zoneRecords = zones, records
+    home.owdPending.intersection_update(record.id for record in records.values())
+    return records
+
+def update_zones(records: dict, zoneStates: dict) -> list:
+    """Applies a zoneStates payload to the records; returns the records whose OWD state changed."""
+    changed = []
+    for key, state in zoneStates.items():
+        record = records.get(key)
+        if record is None:
+             continue
+        detected = bool(state.get("openWindowDetected"))
+        active = bool(state.get("openWindow"))
+        if detected != record.detected or active != record.active:
+             record.detected, record.active = detected, active
+             changed.append(record)
+    return changed
+
+def update_devices(home: "TadoHome", mobile_devices: list) -> bool:
+    """
+    Applies a mobileDevices payload to home.deviceRecords. Returns True (and rebuilds
+    home.devicesHome) only when the tracked devices at home changed.
+    """
+    records = home.deviceRecords
+    changed = False
+    for device in mobile_devices:
+        device_id = device.get("id")
+        name = device.get("name", f"Dev_{device_id or 'Unk'}")
+        record = records.get(device_id)
+        if record is None:
+             record = records[device_id] = DeviceRecord(device_id, name)
+             changed = True
+        elif name != record.name:
+             # Renamed phone: devicesHome lists names
+             record.name = name
+             changed = True
+        location = device.get("location")
+        tracked = bool((device.get("settings") or {}).get("geoTrackingEnabled"))
+        at_home = tracked and bool(location and location.get("atHome"))
+        if at_home != record.at_home or tracked != record.tracked:
+             changed = True
+        record.tracked, record.located, record.at_home = tracked, bool(location), at_home
+    if len(records) != len(mobile_devices):
+        # Devices were removed from the account
+        seen = {device.get("id") for device in mobile_devices}
+        records = home.deviceRecords = {key: record for key, record in records.items() if key in seen}
+        changed = True
+    if changed:
+        home.devicesHome = [record.name for record in records.values() if record.at_home]
+    return changed
+
+# --- Per-Home State ---
+class TadoHome:
+    """Connection, credentials and health state of one Tado home (account + token file)."""
+    def __init__(self, name: str, token_file_path: str, username: str | None = None, password: str | None = None,
+                 daily_budget: int = 0):
+        self.name = name
+        self.token_file_path = token_file_path
+        self.username = username
+        self.password = password
+        self.t: Tado | None = None
+        self.devicesHome: list[str] = []
+        # Parsed payloads, kept between cycles so only changes are acted on
+        self.zoneList: list | None = None
+        self.zoneRecords: dict[str, ZoneRecord] = {}
+        self.deviceRecords: dict = {}
+        self.owdPending: set = set()
+        self.lastMessages: dict[str, str] = {}
+        self.lastPresenceMsg: str = ""
+        self.lastPresenceKey: tuple | None = None
+        self.lastCallsMsg: str = ""
+        self.cycleId: int | None = None
+        self.cycleCount: int = 0
+        self.cycleStartedAt: float = 0.0
+        # Set by POST /trigger or SIGUSR1 to cut the wait before the next cycle short
+        self.wake = Event()
+        # Last warm-restart state written to disk and when
+        self.savedState: dict | None = None
+        self.savedStateAt: float = 0.0
+        self.savedZoneList: list | None = None
+        # method -> [bucket counts..., +Inf count, sum]; method -> {result: count}
+        self.callHistograms: dict[str, list[float]] = {}
+        self.callResults: dict[str, dict[str, int]] = {}
+        # Single-home mode logs as "TadoAA", multi-home mode as "TadoAA.<name>"
+        self.logger = HomeLogger(logger.getChild(name) if name else logger, self)
+        # Read by the health server, which must not do any network I/O itself
+        self.snapshot: dict = {
+            "auth_status": None,
+            "last_cycle_at": None,
+            "last_cycle_duration": None,
+            "last_error": None,
+            "last_error_at": None,
+            "mode": None,
+            "devices_home": [],
+            "last_owd_activation": None,
+            "last_recovery_seconds": None,
+        }
+        self.metrics: dict[tuple[str, str], float] = {}
+        self.lock = Lock()
+        self.budget = ApiBudget(daily_budget, f"{token_file_path}.budget")
+        self.cache = MetadataCache(self)
+        self.backoff = Backoff()
+        self.breakers = {group: CircuitBreaker(self, group) for group in BREAKER_GROUPS}
+        self.presence = PresenceDebouncer(self)
+
+    def publish(self, **fields):
+        """Replaces the status snapshot with an updated copy."""
+        with self.lock:
+            self.snapshot = {**self.snapshot, **fields}
+
+    def count(self, metric: str, value: float = 1, label: str = ""):
+        """Adds value to a counter in the home's metrics."""
+        with self.lock:
+            self.metrics[(metric, label)] = self.metrics.get((metric, label), 0) + value
+
+    def record_call(self, method: str, duration: float, result: str):
+        """Adds one timed Tado call to the histograms (and the trace file, if enabled)."""
+        with self.lock:
+            histogram = self.callHistograms.get(method)
+            if histogram is None:
+                histogram = self.callHistograms[method] = [0] * (len(CALL_BUCKETS) + 2)
+            for i, bound in enumerate(CALL_BUCKETS):
+                if duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += duration
+            results = self.callResults.setdefault(method, {})
+            results[result] = results.get(result, 0) + 1
+        if traceFile is not None:
+            write_trace({"ts": round(time.time(), 3), "home": self.name, "cycle": self.cycleId,
+                         "method": method, "duration_ms": round(duration * 1000, 2), "result": result})
+
+    def record_error(self, e: Exception):
+        """
+        Publishes e as the last error and counts it by exception class, once per
+        exception: a zone error re-raised for the whole OWD group is not counted again.
+        """
+        if getattr(e, "_tadoaa_recorded", False):
+            return
+        e._tadoaa_recorded = True
+        self.count("tado_errors_total", label=e.__class__.__name__)
+        self.publish(last_error=f"{e.__class__.__name__}: {e}", last_error_at=time.time())
+
+homes: list[TadoHome] = []
 
 # --- Health Check Server ---
+def home_health(home: TadoHome) -> tuple[int, str]:
+    """Returns (HTTP status code, message) describing one home, from its snapshot."""
+    current_status = home.snapshot["auth_status"]
+    if current_status is None:
+        return 503, "Error: Tado Not Initialized"
+    if current_status == DeviceActivationStatus.COMPLETED:
+        open_groups = [group for group, breaker in home.breakers.items() if breaker.state != "closed"]
+        if open_groups:
+            return 200, f"OK: Authenticated (circuit open: {', '.join(open_groups)})"
+        return 200, "OK: Authenticated"
+    if current_status == DeviceActivationStatus.PENDING:
+        return 200, "OK: Pending User Auth"
+    return 503, f"Error: Status {current_status}"
+
+METRICS = {
+    "tado_up": ("gauge", "1 if the home is authenticated or pending user auth"),
+    "tado_cycles_total": ("counter", "Completed monitoring cycles"),
+    "tado_cycle_duration_seconds": ("summary", "Duration of completed monitoring cycles"),
+    "tado_last_cycle_timestamp_seconds": ("gauge", "Unix time of the last completed cycle"),
+    "tado_api_calls_total": ("counter", "Tado API calls made by the monitoring loop"),
+    "tado_api_requests_total": ("counter", "HTTP requests sent to Tado by endpoint"),
+    "tado_api_budget_used_today": ("gauge", "Tado API requests counted against today's budget"),
+    "tado_api_quota_remaining": ("gauge", "Remaining requests reported by Tado's RateLimit header"),
+    "tado_poll_interval_seconds": ("gauge", "Current wait between monitoring cycles"),
+    "tado_api_call_duration_seconds": ("histogram", "Latency of calls on the Tado object by method"),
+    "tado_api_call_results_total": ("counter", "Calls on the Tado object by method and result"),
+    "tado_cache_hits_total": ("counter", "Metadata served from cache (upstream calls saved) by endpoint"),
+    "tado_cache_misses_total": ("counter", "Metadata fetched upstream by endpoint"),
+    "tado_token_refreshes_total": ("counter", "Access token refreshes done by the app by result"),
+    "tado_session_recoveries_total": ("counter", "Auth errors recovered in place or by full re-initialization"),
+    "tado_warm_restarts_total": ("counter", "Starts that skipped the initial status check using the saved state"),
+    "tado_breaker_state": ("gauge", "Circuit breaker state by endpoint group (0 closed, 1 half-open, 2 open)"),
+    "tado_breaker_trips_total": ("counter", "Times a circuit breaker opened by endpoint group"),
+    "tado_triggers_total": ("counter", "Immediate cycle requests by source"),
+    "tado_triggered_cycles_total": ("counter", "Cycles started early by a trigger (coalesced requests count once)"),
+    "tado_presence_writes_suppressed_total": ("counter", "HOME/AWAY writes held back by reason (debounce, cooldown)"),
+    "tado_log_records_dropped_total": ("counter", "Log records dropped because the log queue was full (process-wide)"),
+    "tado_errors_total": ("counter", "Errors by exception class"),
+    "tado_devices_home": ("gauge", "Geo-tracked devices at home"),
+    "tado_owd_activations_total": ("counter", "Open windows activated via set_open_window()"),
+    "tado_presence_writes_total": ("counter", "HOME/AWAY switches by target mode"),
+}
+
+COUNTER_LABELS = {
+    "tado_errors_total": "type",
+    "tado_presence_writes_total": "mode",
+    "tado_cache_hits_total": "endpoint",
+    "tado_cache_misses_total": "endpoint",
+    "tado_token_refreshes_total": "result",
+    "tado_session_recoveries_total": "result",
+    "tado_breaker_trips_total": "group",
+    "tado_triggers_total": "source",
+    "tado_presence_writes_suppressed_total": "reason",
+}
+
+def render_metrics() -> str:
+    """Renders all homes' snapshots and counters in the Prometheus text format."""
+    samples = {metric: [] for metric in METRICS}
+    for home in homes:
+        snapshot = home.snapshot
+        with home.lock:
+            counters = dict(home.metrics)
+            histograms = {method: list(values) for method, values in home.callHistograms.items()}
+            call_results = {method: dict(values) for method, values in home.callResults.items()}
+        labels = f'home="{home.name}"'
+        samples["tado_up"].append((labels, 1 if home_health(home)[0] == 200 else 0))
+        samples["tado_devices_home"].append((labels, len(snapshot["devices_home"])))
+        if snapshot["last_cycle_at"] is not None:
+            samples["tado_last_cycle_timestamp_seconds"].append((labels, snapshot["last_cycle_at"]))
+        budget = home.budget.stats()
+        for endpoint, value in sorted(budget["endpoints"].items()):
+            samples["tado_api_requests_total"].append((f'{labels},endpoint="{endpoint}"', value))
+        samples["tado_api_budget_used_today"].append((labels, budget["used_today"]))
+        samples["tado_poll_interval_seconds"].append((labels, budget["interval"]))
+        for group, breaker in home.breakers.items():
+            samples["tado_breaker_state"].append((f'{labels},group="{group}"', BREAKER_STATES[breaker.state]))
+        if budget["quota_remaining"] is not None:
+            samples["tado_api_quota_remaining"].append((labels, budget["quota_remaining"]))
+        for method, histogram in sorted(histograms.items()):
+            method_labels = f'{labels},method="{method}"'
+            histogram_name = "tado_api_call_duration_seconds"
+            for bound, value in zip(CALL_BUCKETS, histogram):
+                samples[histogram_name].append((f'{method_labels},le="{bound}"', value, f"{histogram_name}_bucket"))
+            samples[histogram_name].append((f'{method_labels},le="+Inf"', histogram[-2], f"{histogram_name}_bucket"))
+            samples[histogram_name].append((method_labels, histogram[-1], f"{histogram_name}_sum"))
+            samples[histogram_name].append((method_labels, histogram[-2], f"{histogram_name}_count"))
+        for method, results in sorted(call_results.items()):
+            for result, value in sorted(results.items()):
+                samples["tado_api_call_results_total"].append((f'{labels},method="{method}",result="{result}"', value))
+        for (metric, label), value in sorted(counters.items()):
+            if metric in COUNTER_LABELS:
+                samples[metric].append((f'{labels},{COUNTER_LABELS[metric]}="{label}"', value))
+            elif metric.startswith("tado_cycle_duration_seconds"):
+                samples["tado_cycle_duration_seconds"].append((labels, value, metric))
+            else:
+                samples[metric].append((labels, value))
+    if logQueueHandler is not None:
+        samples["tado_log_records_dropped_total"].append(("", logQueueHandler.dropped))
+    lines = []
+    for metric, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for sample in samples[metric]:
+            name = sample[2] if len(sample) > 2 else metric
+            lines.append(f"{name}{{{sample[0]}}} {sample[1]}")
+    return "\n".join(lines) + "\n"
+
 class MyHandler(BaseHTTPRequestHandler):
     def do_GET(self):
-        status_code = 503; status_message = "Error: Tado Not Initialized"
-        if t is not None:
-             try:
-                current_status = t.device_activation_status()
-                if current_status == DeviceActivationStatus.COMPLETED:
-                    status_code = 200; status_message = "OK: Authenticated"
-                elif current_status == DeviceActivationStatus.PENDING:
-                    status_code = 200; status_message = "OK: Pending User Auth"
-                else:
-                    status_code = 503; status_message = f"Error: Status {current_status}"
-             except Exception as e:
-                 status_code = 503; status_message = f"Error: Failed status ({e.__class__.__name__})"
-                 logger.warning(f"Health check failed: {e}", exc_info=False)
+        content_type = "text/plain"
+        if self.path == "/metrics":
+             status_code = 200
+             body = render_metrics()
+             content_type = "text/plain; version=0.0.4"
+        elif self.path == "/status":
+             status_code = 200
+             body = json.dumps({home.name: {**home.snapshot, "budget": home.budget.stats(), "cache": home.cache.stats(),
+                                            "breakers": {group: breaker.stats() for group, breaker in home.breakers.items()}}
+                                for home in homes}, default=str)
+             content_type = "application/json"
+        else:
+             status_code = 503; status_message = "Error: Tado Not Initialized"
+             if len(homes) == 1:
+                  status_code, status_message = home_health(homes[0])
+             elif homes:
+                  # One failing household must not get the whole process restarted by the probes
+                  results = [(home.name, *home_health(home)) for home in homes]
+                  status_code = 200 if any(code == 200 for _, code, _ in results) else 503
+                  status_message = "\n".join(f"{name}: {message}" for name, _, message in results)
+             body = f"{status_message}\n"
+        self.send_response(status_code)
+        self.send_header("Content-type", content_type)
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/trigger":
+             status_code, body = 404, "Not Found"
+        elif triggerSecret and not hmac.compare_digest(
+                  self.headers.get("Authorization", "").encode(), f"Bearer {triggerSecret}".encode()):
+             status_code, body = 401, "Unauthorized"
+        else:
+             names = parse_qs(url.query).get("home")
+             selected = [home for home in homes if names is None or home.name in names]
+             if selected:
+                  trigger_homes(selected, "http")
+                  status_code, body = 202, f"Triggered: {', '.join(home.name or 'default' for home in selected)}"
+             else:
+                  status_code, body = 404, "Unknown home"
         self.send_response(status_code)
         self.send_header("Content-type", "text/plain")
         self.end_headers()
-        self.wfile.write(f"{status_message}\n".encode("utf-8"))
+        self.wfile.write(f"{body}\n".encode("utf-8"))
     def log_message(self, format, *args): 
         return
 
+def trigger_homes(selected: list[TadoHome], source: str):
+    """Asks the engines of the selected homes to run their next cycle now."""
+    for home in selected:
+        home.count("tado_triggers_total", label=source)
+        home.wake.set()
+
+def handle_sigusr1(signum, frame):
+    # Event.set() takes a lock the interrupted main thread may hold: set it from another thread
+    Thread(target=trigger_homes, args=(list(homes), "signal"), daemon=True).start()
+
 def health_check_server():
     port = int(os.getenv("TADO_HEALTHCHECK_PORT", default=8080))
     logger.info(f"Starting health check status server on port {port}")
     try:
-        socketserver.TCPServer.allow_reuse_address = True
-        httpd = socketserver.TCPServer(("0.0.0.0", port), MyHandler)
+        ThreadingHTTPServer.allow_reuse_address = True
+        ThreadingHTTPServer.daemon_threads = True
+        httpd = ThreadingHTTPServer(("0.0.0.0", port), MyHandler)
         httpd.serve_forever()
     except Exception as e:
         logger.error(f"Health check server failed: {e}", exc_info=True)
 
+# --- HTTP Approval Function ---
+HTTP_APPROVAL_TIMEOUT = 20
+
+class FormParser(HTMLParser):
+    """Collects the forms of a page: id, action, method and the values they would submit."""
+    def __init__(self):
+        super().__init__()
+        self.forms: list[dict] = []
+        self._form: dict | None = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self._form = {"id": attrs.get("id"), "action": attrs.get("action"),
+                          "method": (attrs.get("method") or "get").lower(), "fields": {}, "submit": False}
+            self.forms.append(self._form)
+        elif self._form is None or not attrs.get("name"):
+            return
+        elif tag == "input" and attrs.get("type") not in ("checkbox", "radio", "submit", "button", "image"):
+            self._form["fields"][attrs["name"]] = attrs.get("value") or ""
+        elif tag == "input" and attrs.get("type") in ("checkbox", "radio") and "checked" in attrs:
+            self._form["fields"][attrs["name"]] = attrs.get("value") or "on"
+        elif tag == "button" and attrs.get("type", "submit") == "submit" and not self._form["submit"]:
+            # Like the browser flow, submit with the first (primary) button
+            self._form["fields"][attrs["name"]] = attrs.get("value") or ""
+            self._form["submit"] = True
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._form = None
+
+def find_form(html: str, form_id: str | None = None, field: str | None = None) -> dict | None:
+    """Returns the first form with the given id, or containing the given field."""
+    parser = FormParser()
+    parser.feed(html)
+    for form in parser.forms:
+        if (form_id and form["id"] == form_id) or (field and field in form["fields"]):
+            return form
+    return None
+
+def submit_form(session, response, form: dict):
+    """Submits form as found on response's page, following redirects."""
+    action = urljoin(response.url, form["action"] or response.url)
+    if form["method"] == "post":
+        result = session.post(action, data=form["fields"], timeout=HTTP_APPROVAL_TIMEOUT)
+    else:
+        result = session.get(action, params=form["fields"], timeout=HTTP_APPROVAL_TIMEOUT)
+    result.raise_for_status()
+    return result
+
+def http_tado_approval(home: "TadoHome", url: str, user_code: str) -> bool:
+    """
+    Same two stages as automate_tado_approval(), but over plain HTTP with a
+    requests session (cookie jar) instead of a browser:
+      1. Submit the pre-populated "device-form" on the device code page.
+      2. Post loginId/password on the login page.
+    Returns True if the login form was accepted; False otherwise.
+    """
+    if not home.username or not home.password:
+        home.logger.error("TADO_USERNAME and TADO_PASSWORD env vars required for automated approval.")
+        return False
+    home.logger.info("Attempting automated HTTP approval...")
+    session = requests.Session()
+    try:
+        home.logger.info(f"Fetching verification URL: {url}")
+        response = session.get(url, timeout=HTTP_APPROVAL_TIMEOUT)
+        response.raise_for_status()
+
+        # --- Stage 1: Device Code Page ---
+        device_form = find_form(response.text, form_id="device-form")
+        if device_form:
+            home.logger.info("Device code page detected. Submitting code.")
+            for name, value in device_form["fields"].items():
+                if "user_code" in name and not value:
+                    device_form["fields"][name] = user_code
+            response = submit_form(session, response, device_form)
+        else:
+            home.logger.info("Device code form not found; assuming already past device code stage.")
+
+        # --- Stage 2: Login Page ---
+        login_form = find_form(response.text, field="loginId")
+        if not login_form:
+            home.logger.error("Login page did not appear after code submission.")
+            return False
+        home.logger.info("Login page loaded. Submitting credentials...")
+        login_form["fields"]["loginId"] = home.username
+        login_form["fields"]["password"] = home.password
+        response = submit_form(session, response, login_form)
+        if find_form(response.text, field="password"):
+            home.logger.error("Login page returned again after sign in (wrong credentials?).")
+            return False
+        home.logger.info("HTTP approval submitted (login accepted).")
+        return True
+    except requests.RequestException as e:
+        home.logger.error(f"Error during HTTP approval: {e}")
+        return False
+    finally:
+        session.close()
+
 # --- Browser Automation Function ---
-def automate_tado_approval(url: str, user_code: str) -> bool:
+def save_screenshot(driver, filename: str, failed: bool = False):
+    """Writes a debug screenshot when TADO_BROWSER_SCREENSHOTS is set or the stage failed."""
+    if not (browserScreenshots or failed):
+        return
+    try:
+        driver.save_screenshot(filename)
+    except Exception as ss_e:
+        logger.error(f"Screenshot {filename} failed: {ss_e}")
+
+def log_stage(stage: str, started: float):
+    """Logs how long a browser automation stage took."""
+    logger.info(f"Browser stage '{stage}' took {time.monotonic() - started:.2f}s.")
+
+def automate_tado_approval(url: str, user_code: str, tado_username: str | None, tado_password: str | None) -> bool:
     """
     Automates the device code approval flow:
       1. On the device code page (stage 1), click the “Submit” button.
       2. On the login page (stage 2), enter the credentials and click the “Sign in” button.
     Returns True on successful automated approval; False otherwise.
     """
-    global tado_username, tado_password
     if not tado_username or not tado_password:
         logger.error("TADO_USERNAME and TADO_PASSWORD env vars required for browser automation.")
         return False
 
+    # --- Selenium Imports ---
+    # Only needed for the rare pending device flow, so they are not loaded at startup
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.firefox.options import Options as FirefoxOptions
+        from selenium.webdriver.firefox.service import Service as FirefoxService
+    except ImportError:
+        logger.error("Selenium library not found. Please install: pip install selenium")
+        return False
+
     logger.info("Attempting automated browser approval using Firefox...")
     options = FirefoxOptions()
     options.add_argument("--headless")
@@ -115,35 +1179,46 @@ def automate_tado_approval(url: str, user_code: str) -> bool:
 
         service = FirefoxService(executable_path=geckodriver_path)
         driver = webdriver.Firefox(service=service, options=options)
-        wait = WebDriverWait(driver, 20)
+        wait = WebDriverWait(driver, browserTimeout)
 
+        stage_start = time.monotonic()
         logger.info(f"Navigating to verification URL: {url}")
         driver.get(url)
-        time.sleep(5)
         try:
-            driver.save_screenshot("debug_after_navigating.png")
-        except Exception as ss_e:
-            logger.error(f"Screenshot failed: {ss_e}")
+            # Either the device code page or, if already past it, the login page
+            wait.until(EC.any_of(EC.presence_of_element_located((By.ID, "device-form")),
+                                 EC.presence_of_element_located((By.ID, "loginId"))))
+        except TimeoutException:
+            logger.error("TimeoutException: Neither device code nor login page appeared.")
+            save_screenshot(driver, "debug_after_navigating.png", failed=True)
+            return False
+        log_stage("navigate", stage_start)
+        save_screenshot(driver, "debug_after_navigating.png")
 
         # --- Stage 1: Device Code Page ---
         # If the device code form is present, then we are on the page where the user code is pre-populated.
-        try:
-            device_form = wait.until(EC.presence_of_element_located((By.ID, "device-form")))
+        device_forms = driver.find_elements(By.ID, "device-form")
+        if device_forms:
+            stage_start = time.monotonic()
             logger.info("Device code page detected. Proceeding with code submission.")
             # The button on this page:
             submit_locator_code = (By.CSS_SELECTOR, "button.c-btn.c-btn--primary.primary.button")
-            submit_button = wait.until(EC.element_to_be_clickable(submit_locator_code))
-            logger.info("Clicking the Submit button on device code page.")
-            submit_button.click()
-            time.sleep(5)
             try:
-                driver.save_screenshot("debug_after_code_submit.png")
-            except Exception as ss_e:
-                logger.error(f"Screenshot failed after code submit: {ss_e}")
-        except TimeoutException:
+                submit_button = wait.until(EC.element_to_be_clickable(submit_locator_code))
+                logger.info("Clicking the Submit button on device code page.")
+                submit_button.click()
+                wait.until(EC.staleness_of(device_forms[0]))
+            except TimeoutException:
+                logger.error("TimeoutException: Device code page did not change after code submission.")
+                save_screenshot(driver, "debug_after_code_submit.png", failed=True)
+                return False
+            log_stage("code submit", stage_start)
+            save_screenshot(driver, "debug_after_code_submit.png")
+        else:
             logger.info("Device code form not found; assuming already past device code stage.")
 
         # --- Stage 2: Login Page ---
+        stage_start = time.monotonic()
         try:
             username_locator = (By.ID, "loginId")
             password_locator = (By.ID, "password")
@@ -159,19 +1234,24 @@ def automate_tado_approval(url: str, user_code: str) -> bool:
             signin_button = wait.until(EC.element_to_be_clickable(signin_locator))
             logger.info("Clicking the Sign in button.")
             signin_button.click()
-            time.sleep(7)
-            try:
-                driver.save_screenshot("debug_after_login.png")
-            except Exception as ss_e:
-                logger.error(f"Screenshot failed after login: {ss_e}")
-            logger.info("Browser approval submitted (logged-out flow, assuming success after login).")
-            return True
+            # The login page is replaced once the sign in has been processed
+            wait.until(EC.staleness_of(login_username_field))
         except TimeoutException:
-            logger.error("TimeoutException: Login page did not appear after code submission.")
+            logger.error("TimeoutException: Login page did not appear or did not change after sign in.")
+            save_screenshot(driver, "debug_after_login.png", failed=True)
             return False
         except Exception as e:
             logger.error(f"Error during login form submission: {e}", exc_info=True)
+            save_screenshot(driver, "debug_after_login.png", failed=True)
+            return False
+        log_stage("sign in", stage_start)
+        if driver.find_elements(*username_locator):
+            logger.error("Login page returned after sign in (wrong credentials?).")
+            save_screenshot(driver, "debug_after_login.png", failed=True)
             return False
+        save_screenshot(driver, "debug_after_login.png")
+        logger.info("Browser approval submitted (login page left after sign in).")
+        return True
 
     except Exception as e:
         if "executable needs to be in PATH" in str(e) or "Unable to obtain driver" in str(e):
@@ -184,236 +1264,685 @@ def automate_tado_approval(url: str, user_code: str) -> bool:
             logger.debug("Closing WebDriver.")
             driver.quit()
 
+def run_approval_worker(home: "TadoHome", url: str, user_code: str) -> bool:
+    """
+    Runs automate_tado_approval() in a short-lived child process (this script with
+    --approve), so the daemon itself never loads Selenium or keeps Firefox around.
+    Credentials are handed over through the environment, not the command line.
+    """
+    env = {**os.environ, "TADO_USERNAME": home.username or "", "TADO_PASSWORD": home.password or ""}
+    cmd = [sys.executable, os.path.abspath(__file__), "--approve", url, user_code]
+    try:
+        # Own session, so a hung Firefox/geckodriver can be killed together with the worker
+        proc = subprocess.Popen(cmd, env=env, start_new_session=True)
+    except OSError as e:
+        home.logger.error(f"Cannot start approval worker: {e}")
+        return False
+    try:
+        return proc.wait(timeout=approvalTimeout) == 0
+    except subprocess.TimeoutExpired:
+        home.logger.error(f"Approval worker timed out after {approvalTimeout:.0f}s. Killing it.")
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+        return False
+
+def approve_device(home: "TadoHome", url: str, user_code: str) -> bool:
+    """Approves a pending device flow with the configured engine (http, browser or auto)."""
+    if approvalEngine in ("http", "auto"):
+        if http_tado_approval(home, url, user_code):
+            return True
+        if approvalEngine == "http":
+            return False
+        home.logger.info("HTTP approval failed. Falling back to browser approval...")
+    return run_approval_worker(home, url, user_code)
+
 # --- Main Tado Logic ---
-def printm(message):
-    """Logs a message only if it's different from the last one."""
-    global lastMessage
-    if message != lastMessage:
-        logger.info(message)
-        lastMessage = message
-
-def initialize_tado():
-    """Initializes Tado connection, handling auth and automation."""
-    global t, token_file_path, tado_username, tado_password
-    tado_username = os.getenv("TADO_USERNAME")
-    tado_password = os.getenv("TADO_PASSWORD")
-    token_file_path = os.getenv("TADO_TOKEN_FILE")
-    if not token_file_path:
-        logger.critical("TADO_TOKEN_FILE env var missing.")
-        sys.exit(1)
-    token_dir = os.path.dirname(token_file_path)
+def printm(message, home: TadoHome | None = None, key: str = "", **fields):
+    """
+    Logs a message unless it repeats the last one logged under the same key (per
+    home), e.g. one key per zone so zone workers do not defeat each other's dedup.
+    fields (zone, devices, mode, action) go to the record for the JSON log format.
+    """
+    messages = lastMessages if home is None else home.lastMessages
+    with printLock:
+        if messages.get(key) == message:
+            return
+        messages[key] = message
+    (logger if home is None else home.logger).info(message, extra=fields)
+
+def prepare_token_dir(home: TadoHome) -> bool:
+    """Creates the directory of the home's token file if needed."""
+    token_dir = os.path.dirname(home.token_file_path)
     if token_dir and not os.path.exists(token_dir):
          try:
              os.makedirs(token_dir, exist_ok=True)
-             logger.info(f"Created token dir: {token_dir}")
+             home.logger.info(f"Created token dir: {token_dir}")
          except OSError as e:
-             logger.error(f"Cannot create token dir {token_dir}: {e}")
-             sys.exit(1)
-    logger.info(f"Initializing Tado. Token file: {token_file_path}")
+             home.logger.error(f"Cannot create token dir {token_dir}: {e}")
+             return False
+    return True
+
+def initialize_tado(home: TadoHome):
+    """Initializes Tado connection, handling auth and automation."""
+    home.cycleId = None
+    home.logger.info(f"Initializing Tado. Token file: {home.token_file_path}")
     while True:
-        t = None
+        wait = home.breakers["auth"].remaining()
+        if wait > 0:
+             printm(f"Auth circuit open. Waiting {wait:.0f}s before the next attempt.", home)
+             time.sleep(wait)
+        home.breakers["auth"].allow()
+        close_session(home)
+        home.publish(auth_status=None)
+        home.cache.invalidate()
         try:
-            t = Tado(token_file_path=token_file_path, debug=(logger.level == logging.DEBUG))
-            status = t.device_activation_status()
+            home.t = Tado(token_file_path=home.token_file_path, debug=(logger.level == logging.DEBUG))
+            if callTiming:
+                home.t = TracedTado(home.t, home)
+            home.budget.observe(home.t)
+            if sessionReuse:
+                keep_session(home)
+            status = home.t.device_activation_status()
+            home.publish(auth_status=status)
+            home.breakers["auth"].success()
             if status == DeviceActivationStatus.COMPLETED:
-                printm("Tado connection successful (token OK).")
-                return t
+                printm("Tado connection successful (token OK).", home)
+                home.backoff.reset()
+                return home.t
             elif status == DeviceActivationStatus.PENDING:
-                user_code = t._http.user_code
-                verification_url = t.device_verification_url()
+                user_code = home.t._http.user_code
+                verification_url = home.t.device_verification_url()
                 if verification_url and user_code:
-                     printm("Device flow pending. Attempting automated browser approval...")
-                     auto_approved = automate_tado_approval(verification_url, user_code)
+                     printm(f"Device flow pending. Attempting automated approval ({approvalEngine})...", home)
+                     with approvalLock:
+                          auto_approved = approve_device(home, verification_url, user_code)
                      if auto_approved:
-                         printm("Automated approval attempt finished. Polling...")
+                         printm("Automated approval attempt finished. Polling...", home)
                      else:
-                         printm("Automated approval failed. Manual approval might be needed.")
-                         printm(f"!!! MANUAL: Go to {verification_url} Code: {user_code} !!!")
+                         printm("Automated approval failed. Manual approval might be needed.", home)
+                         printm(f"!!! MANUAL: Go to {verification_url} Code: {user_code} !!!", home)
                 else:
-                     printm(f"Could not get URL/Code. Manual approval needed: {user_code or 'UNKNOWN'}")
-                activation_success = t.device_activation()
-                logger.debug(f"t.device_activation() returned: {activation_success} (Type: {type(activation_success)})")
+                     printm(f"Could not get URL/Code. Manual approval needed: {user_code or 'UNKNOWN'}", home)
+                activation_success = home.t.device_activation()
+                home.logger.debug(f"t.device_activation() returned: {activation_success} (Type: {type(activation_success)})")
                 if activation_success:
-                    printm("Device authorization successful (API polling confirmed)!")
-                    final_status = t.device_activation_status()
+                    printm("Device authorization successful (API polling confirmed)!", home)
+                    final_status = home.t.device_activation_status()
+                    home.publish(auth_status=final_status)
                     if final_status == DeviceActivationStatus.COMPLETED:
-                        printm("Tado connection successful (new token).")
-                        return t
+                        printm("Tado connection successful (new token).", home)
+                        home.backoff.reset()
+                        return home.t
                     else:
-                        printm(f"Error: Activation OK but status {final_status}. Retrying...")
-                        time.sleep(errorRetringInterval)
+                        printm(f"Error: Activation OK but status {final_status}. Retrying...", home)
+                        time.sleep(retry_delay(home))
                         continue
                 else:
-                    printm("Device activation failed (API polling failed after auto-attempt).")
-                    time.sleep(errorRetringInterval)
+                    printm("Device activation failed (API polling failed after auto-attempt).", home)
+                    time.sleep(retry_delay(home))
                     continue
             else:
-                printm(f"Error: Init status {status}. Retrying...")
-                time.sleep(errorRetringInterval)
+                printm(f"Error: Init status {status}. Retrying...", home)
+                time.sleep(retry_delay(home))
                 continue
         except TadoCredentialsException as e:
-            printm(f"Auth Error startup: {e}.")
-            time.sleep(errorRetringInterval)
+            home.record_error(e)
+            printm(f"Auth Error startup: {e}.", home)
+            home.breakers["auth"].failure()
+            time.sleep(retry_delay(home, "auth"))
             continue
         except TadoException as e:
-            printm(f"Tado Conn/Init Error: {e}. Retrying...")
-            time.sleep(errorRetringInterval)
+            home.record_error(e)
+            printm(f"Tado Conn/Init Error: {e}. Retrying...", home)
+            home.breakers["auth"].failure()
+            time.sleep(retry_delay(home, "auth"))
             continue
         except Exception as e:
-            logger.error(f"Unexpected error during init: {e}", exc_info=True)
-            time.sleep(errorRetringInterval)
+            home.record_error(e)
+            home.logger.error(f"Unexpected error during init: {e}", exc_info=True)
+            home.breakers["auth"].failure()
+            time.sleep(retry_delay(home, "auth"))
             continue
 
-def homeStatus():
+def homeStatus(home: TadoHome):
     """Checks initial home/away status and syncs if needed."""
-    global devicesHome
-    if t is None:
-        printm("Error: Tado not init homeStatus().")
+    home.cycleId = None
+    if home.t is None:
+        printm("Error: Tado not init homeStatus().", home)
         return False
     try:
-        if t.device_activation_status() != DeviceActivationStatus.COMPLETED:
-            printm(f"Error: Tado not auth ({t.device_activation_status()}) homeStatus().")
+        if home.t.device_activation_status() != DeviceActivationStatus.COMPLETED:
+            printm(f"Error: Tado not auth ({home.t.device_activation_status()}) homeStatus().", home)
             return False
     except Exception as e:
-         printm(f"Error get status homeStatus(): {e}.")
+         printm(f"Error get status homeStatus(): {e}.", home)
          return False
-    printm("Checking initial status...");
+    printm("Checking initial status...", home);
     try:
-        homeState = t.get_home_state()["presence"]
-        devicesHome = []
-        mobile_devices = t.get_mobile_devices()
+        homeState = home.t.get_home_state()["presence"]
+        mobile_devices = home.t.get_mobile_devices() or []
         if not mobile_devices:
-             printm("Warning: No mobile devices found.")
-        for mobileDevice in mobile_devices:
-            dev_name = mobileDevice.get("name", f"DeviceID_{mobileDevice.get('id', 'Unknown')}")
-            if mobileDevice.get("settings", {}).get("geoTrackingEnabled"):
-                 if mobileDevice.get("location") and mobileDevice["location"].get("atHome"):
-                      devicesHome.append(dev_name)
-                 else:
-                      printm(f"Warn: No location for {dev_name}")
-        num_home = len(devicesHome)
-        dev_str = ", ".join(devicesHome) if num_home > 0 else "none"
-        if num_home > 0 and homeState == "HOME":
-             printm(f"HOME Mode. Devices: {dev_str}.")
-        elif num_home == 0 and homeState == "AWAY":
-             printm("AWAY Mode. No devices home.")
-        elif num_home == 0 and homeState == "HOME":
-             printm("HOME Mode, no devices home -> AWAY.")
-             t.set_away()
-             printm("AWAY set.")
-        elif num_home > 0 and homeState == "AWAY":
-             printm(f"AWAY Mode, devices ({dev_str}) home -> HOME.")
-             t.set_home()
-             printm("HOME set.")
-        printm("Initial status check complete.")
+             printm("Warning: No mobile devices found.", home)
+        home.deviceRecords = {}
+        update_devices(home, mobile_devices)
+        devicesHome = home.devicesHome
+        for record in home.deviceRecords.values():
+            if record.tracked and not record.located:
+                 printm(f"Warn: No location for {record.name}", home)
+        dev_str = ", ".join(devicesHome) if devicesHome else "none"
+        home.publish(mode=homeState, devices_home=list(devicesHome))
+        printm(f"{homeState} Mode. Devices home: {dev_str}.", home, key="presence",
+               devices=len(devicesHome), mode=homeState, action="status")
+        sync_presence(home, homeState, devicesHome)
+        printm("Initial status check complete.", home)
         return True
     except TadoCredentialsException as e:
-         printm(f"Auth Error status check: {e}. Re-init needed.")
+         home.record_error(e)
+         printm(f"Auth Error status check: {e}. Re-init needed.", home)
          return False
     except TadoException as e:
-         printm(f"API error status check: {e}. Retry later.")
+         home.record_error(e)
+         printm(f"API error status check: {e}. Retry later.", home)
          return False
     except KeyError as e:
-         logger.error(f"KeyError status check: {e}", exc_info=True)
-         printm(f"API Response Error. Retry later.")
+         home.record_error(e)
+         home.logger.error(f"KeyError status check: {e}", exc_info=True)
+         printm(f"API Response Error. Retry later.", home)
          return False
     except Exception as e:
-         logger.error(f"Unexpected status check error: {e}", exc_info=True)
-         printm(f"Unexpected status error. Retry later.")
+         home.record_error(e)
+         home.logger.error(f"Unexpected status check error: {e}", exc_info=True)
+         printm(f"Unexpected status error. Retry later.", home)
          return False
 
-def engine():
-    """Main monitoring loop."""
-    if t is None:
-         printm("Error: Tado not init engine().")
+def state_file_path(home: TadoHome) -> str:
+    return f"{home.token_file_path}.state"
+
+def save_state(home: TadoHome, mode: str, devices_home: list[str], owd_active: set, zones):
+    """
+    Persists what a restart needs to skip the initial resync: presence mode, devices at
+    home, zones with an activated open window and the zone list. Rewritten when it
+    changes or when the copy on disk is half way to stateMaxAge.
+    """
+    if stateMaxAge <= 0:
+        return
+    state = {
+        "mode": mode,
+        "devices_home": sorted(devices_home),
+        "owd_active": sorted(owd_active, key=str),
+        # Zones were not fetched when OWD was skipped or failed: keep the saved list
+        "zones": (home.savedState or {}).get("zones", []),
+    }
+    if zones and zones is not home.savedZoneList:
+        home.savedZoneList = zones
+        state["zones"] = [{"id": z.get("id"), "name": z.get("name")} for z in zones]
+    now = time.time()
+    if state == home.savedState and now - home.savedStateAt < stateMaxAge / 2:
+        return
+    try:
+        write_json_atomic(state_file_path(home), {**state, "last_cycle_at": now})
+        home.savedState, home.savedStateAt = state, now
+    except OSError as e:
+        home.logger.warning(f"Cannot save state file: {e}")
+
+def load_state(home: TadoHome) -> dict | None:
+    """Returns the saved state if the cycle that wrote it is at most stateMaxAge old."""
+    if stateMaxAge <= 0:
+        return None
+    try:
+        with open(state_file_path(home), encoding="utf-8") as f:
+            state = json.load(f)
+        age = time.time() - float(state["last_cycle_at"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        home.logger.warning(f"Ignoring state file: {e}")
+        return None
+    if not 0 <= age <= stateMaxAge:
+        home.logger.debug(f"State file is {age:.0f}s old. Cold start.")
+        return None
+    state["age"] = age
+    return state
+
+def apply_state(home: TadoHome, state: dict, owdActivated: set):
+    """Restores a loaded state in place of homeStatus(); the first cycle then diffs against it."""
+    home.devicesHome = list(state.get("devices_home", []))
+    owdActivated.update(state.get("owd_active", []))
+    if state.get("zones"):
+         home.cache.put("zones", state["zones"], state["age"])
+    home.publish(mode=state.get("mode"), devices_home=list(home.devicesHome))
+    home.count("tado_warm_restarts_total")
+    printm(f"Warm restart from state saved {state['age']:.0f}s ago. Mode: {state.get('mode')}, "
+           f"devices home: {', '.join(home.devicesHome) or 'none'}.", home)
+
+def run_all(func, items, executor=None) -> list:
+    """Applies func to every item, on the worker pool when one is given."""
+    if executor is None:
+        return [func(item) for item in items]
+    return list(executor.map(func, items))
+
+def check_zone_window(home: TadoHome, z, failed: list | None = None) -> int:
+    """
+    Checks and activates OWD for one zone. Errors are logged and appended to failed
+    instead of raised, so one bad zone does not stop the others. Returns API calls made.
+    """
+    calls = 0
+    zoneID = z.get("id")
+    zoneName = z.get("name", f"Zone {zoneID}")
+    if not zoneID:
+         home.logger.warning("Zone with no ID.")
+         return calls
+    try:
+        owd_info = home.t.get_open_window_detected(zoneID)
+        calls += 1
+        if owd_info.get("openWindowDetected"):
+             zone_state = home.t.get_state(zoneID)
+             calls += 1
+             if not zone_state.get("openWindow"):
+                  calls += activate_open_window(home, z)
+    except TadoCredentialsException:
+         raise
+    except TadoException as e:
+         home.record_error(e)
+         printm(f"Error OWD {zoneName}: {e}", home, key=f"owd:{zoneID}", zone=zoneName, action="owd_error")
+         if failed is not None:
+              failed.append(e)
+    except KeyError as e:
+         home.record_error(e)
+         home.logger.warning(f"KeyError OWD {zoneName}: {e}")
+         if failed is not None:
+              failed.append(e)
+    return calls
+
+def activate_open_window(home: TadoHome, z) -> int:
+    """Sends set_open_window() for one zone. Returns API calls made."""
+    zoneID = z.get("id")
+    zoneName = z.get("name", f"Zone {zoneID}")
+    printm(f"{zoneName}: OWD detected -> activating.", home, key=f"owd:{zoneID}", zone=zoneName, action="owd_detected")
+    home.t.set_open_window(zoneID)
+    home.count("tado_owd_activations_total")
+    home.publish(last_owd_activation={"zone": zoneName, "at": time.time()})
+    printm(f"{zoneName}: OWD activated.", home, key=f"owd:{zoneID}", zone=zoneName, action="owd_activated")
+    return 1
+
+def check_open_windows(home: TadoHome, zones, executor=None) -> int:
+    """
+    Checks OWD zone by zone (one or two requests per zone). Raises the last error
+    only when every zone failed, so the owd breaker counts group-wide outages but
+    not a single bad zone. Returns API calls made.
+    """
+    failed = []
+    calls = sum(run_all(lambda z: check_zone_window(home, z, failed), zones, executor))
+    if failed and len(failed) >= len(zones):
+         raise failed[-1]
+    return calls
+
+def check_open_windows_batched(home: TadoHome, zones, owdActivated: set, executor=None) -> int:
+    """
+    Checks OWD for all zones from a single zoneStates request.
+    Only zones that newly report a detected (not yet active) open window get a
+    set_open_window() write; owdActivated remembers zones already handled until
+    their detection clears. Returns API calls made.
+    """
+    response = home.t.get_zone_states()
+    calls = 1
+    zoneStates = response.get("zoneStates", response) if isinstance(response, dict) else {}
+    records = index_zones(home, zones)
+    if records.keys() != zoneStates.keys():
+         # Zones were added or removed since the zone list was cached
+         home.cache.invalidate("zones")
+    # Only zones whose state changed since the last payload update the pending set
+    pending = home.owdPending
+    for record in update_zones(records, zoneStates):
+        if record.detected and not record.active:
+             pending.add(record.id)
+        else:
+             pending.discard(record.id)
+             owdActivated.discard(record.id)
+    candidates = [records[str(zoneID)] for zoneID in pending - owdActivated]
+
+    def activate(record: ZoneRecord) -> int:
+        try:
+            written = activate_open_window(home, {"id": record.id, "name": record.name})
+            owdActivated.add(record.id)
+            return written
+        except TadoCredentialsException:
+             raise
+        except TadoException as e:
+             # A failed write is retried next cycle; only the zoneStates fetch counts on the breaker
+             home.record_error(e)
+             printm(f"Error OWD {record.name}: {e}", home, key=f"owd:{record.id}", zone=record.name, action="owd_error")
+             return 0
+
+    return calls + sum(run_all(activate, candidates, executor))
+
+def engine(home: TadoHome, state: dict | None = None):
+    """Main monitoring loop, optionally resuming from a warm-restart state."""
+    if home.t is None:
+         printm("Error: Tado not init engine().", home)
          return
     try:
-         if t.device_activation_status() != DeviceActivationStatus.COMPLETED:
-              printm(f"Error: Tado not auth ({t.device_activation_status()}) engine().")
+         if home.t.device_activation_status() != DeviceActivationStatus.COMPLETED:
+              printm(f"Error: Tado not auth ({home.t.device_activation_status()}) engine().", home)
               return
     except Exception as e:
-         printm(f"Error get status engine(): {e}.")
+         printm(f"Error get status engine(): {e}.", home)
          return
-    printm("Starting monitoring loop...")
-    last_presence_check_msg = ""
+    printm("Starting monitoring loop...", home)
+    home.lastPresenceMsg = ""
+    home.lastPresenceKey = None
+    home.lastCallsMsg = ""
+    owdActivated = set()
+    if state is not None:
+         apply_state(home, state, owdActivated)
+    executor = None
+    if zoneWorkers > 1:
+         executor = ThreadPoolExecutor(max_workers=zoneWorkers, thread_name_prefix="tado-zone")
+    try:
+         engine_loop(home, executor, owdActivated)
+    finally:
+         if executor:
+              executor.shutdown(wait=False, cancel_futures=True)
+
+def sync_presence(home: TadoHome, homeState: str, devicesHome: list[str]) -> tuple[int, str]:
+    """
+    HOME/AWAY decision shared by homeStatus() and the engine: writes the mode the
+    presence debouncer settles on. Returns (API calls made, mode).
+    """
+    target = home.presence.decide(homeState, devicesHome)
+    if target is None:
+         return 0, homeState
+    dev_str = ", ".join(devicesHome) if devicesHome else "none"
+    fields = {"key": "presence", "devices": len(devicesHome), "mode": target, "action": f"set_{target.lower()}"}
+    if target == "HOME":
+         printm(f"Devices ({dev_str}) home, but AWAY -> HOME.", home, **fields)
+         home.t.set_home()
+    else:
+         printm(f"No devices home, but HOME -> AWAY.", home, **fields)
+         home.t.set_away()
+    home.presence.written()
+    home.count("tado_presence_writes_total", label=target)
+    home.publish(mode=target)
+    printm(f"{target} activated.", home, **fields)
+    home.lastPresenceMsg = ""
+    printm("Waiting...", home, key="presence")
+    return 1, target
+
+def owd_pass(home: TadoHome, owdActivated: set, executor=None) -> tuple[list, int, int]:
+    """Open Window Detection for all zones. Returns (zones, API calls made, calls served from cache)."""
+    zones, cached = home.cache.get("zones", home.t.get_zones)
+    calls = 0 if cached else 1
+    if zones:
+         if batchZoneStates:
+              calls += check_open_windows_batched(home, zones, owdActivated, executor)
+         else:
+              calls += check_open_windows(home, zones, executor)
+    return zones, calls, 1 if cached else 0
+
+def presence_pass(home: TadoHome, futures=None) -> tuple[int, str, list[str]]:
+    """
+    Geofencing: switches HOME/AWAY when the devices at home disagree with the mode.
+    Uses the (home state, mobile devices) futures when the fetch ran on the worker
+    pool. Returns (API calls made, mode, devices at home).
+    """
+    if futures:
+         homeState = futures[0].result()["presence"]
+         mobile_devices = futures[1].result()
+    else:
+         homeState = home.t.get_home_state()["presence"]
+         mobile_devices = home.t.get_mobile_devices()
+    calls = 2
+    devices_changed = update_devices(home, mobile_devices or [])
+    currentDevicesHome = home.devicesHome
+    writes, homeState = sync_presence(home, homeState, currentDevicesHome)
+    calls += writes
+    presence_key = (homeState, home.presence.pending, home.presence.samples)
+    if not writes and (devices_changed or presence_key != home.lastPresenceKey):
+         home.lastPresenceKey = presence_key
+         dev_str = ", ".join(currentDevicesHome) if currentDevicesHome else "none"
+         current_msg = (f"Presence: {len(currentDevicesHome)} home ({dev_str}), Mode: {homeState}. No change."
+                        f"{home.presence.status()}")
+         if current_msg != home.lastPresenceMsg:
+              fields = {"devices": len(currentDevicesHome), "mode": homeState, "action": "presence"}
+              if "No change" not in home.lastPresenceMsg:
+                   home.logger.info(current_msg, extra=fields)
+              else:
+                   home.logger.debug(current_msg, extra=fields)
+              home.lastPresenceMsg = current_msg
+    return calls, homeState, currentDevicesHome
+
+def engine_cycle(home: TadoHome, executor, owdActivated: set) -> int:
+    """
+    Runs one OWD + geofencing pass, each behind its circuit breaker. A failing group
+    is recorded and the other one still runs; errors propagate only when every group
+    that ran failed (or on auth errors). Returns API calls made.
+    """
+    home.cycleCount += 1
+    home.cycleId = home.cycleCount
+    cycle_start = home.cycleStartedAt = time.monotonic()
+    home.budget.observe(home.t)
+    errors = []
+    owd_allowed = home.breakers["owd"].allow()
+    presence_allowed = home.breakers["presence"].allow()
+    if not (owd_allowed or presence_allowed):
+         home.logger.debug("All circuits open. Skipping cycle.")
+         return 0
+    # Groups allowed above but not run yet. If an earlier group raises, their
+    # half-open probes are released, or allow() would refuse them for good
+    unsettled = [group for group, allowed in (("owd", owd_allowed), ("presence", presence_allowed)) if allowed]
+    try:
+        # Geofencing fetch runs alongside OWD when a worker pool is configured
+        futures = None
+        if executor and presence_allowed:
+             futures = (executor.submit(home.t.get_home_state), executor.submit(home.t.get_mobile_devices))
+        # Open Window Detection (OWD)
+        zones, owd_calls, cached_calls = None, 0, 0
+        if owd_allowed:
+             unsettled.remove("owd")
+             zones, owd_calls, cached_calls = run_guarded(home, "owd", lambda: owd_pass(home, owdActivated, executor),
+                                                          errors, (None, 0, 0))
+        # Geofencing
+        presence_calls, homeState, currentDevicesHome = 0, home.snapshot["mode"], home.snapshot["devices_home"]
+        if presence_allowed:
+             unsettled.remove("presence")
+             presence_calls, homeState, currentDevicesHome = run_guarded(
+                  home, "presence", lambda: presence_pass(home, futures), errors,
+                  (0, homeState, currentDevicesHome))
+    finally:
+        for group in unsettled:
+             home.breakers[group].release()
+    if errors and len(errors) == owd_allowed + presence_allowed:
+         raise errors[0][1]
+    for group, e in errors:
+         home.record_error(e)
+         home.cache.invalidate()
+         printm(f"API Error ({group}): {e}. Other checks continue.", home, key="error", action=f"{group}_error")
+    cycle_calls = owd_calls + presence_calls
+    cycle_duration = time.monotonic() - cycle_start
+    home.count("tado_cycles_total")
+    home.count("tado_api_calls_total", cycle_calls)
+    home.count("tado_cycle_duration_seconds_sum", cycle_duration)
+    home.count("tado_cycle_duration_seconds_count")
+    home.publish(last_cycle_at=time.time(), last_cycle_duration=cycle_duration, cycle_id=home.cycleId,
+                 mode=homeState, devices_home=currentDevicesHome)
+    save_state(home, homeState, currentDevicesHome, owdActivated, zones)
+    calls_msg = f"API calls per cycle: {cycle_calls} ({len(zones or [])} zones, {cached_calls} from cache)."
+    if calls_msg != home.lastCallsMsg:
+         home.logger.info(calls_msg, extra={"action": "cycle"})
+         home.lastCallsMsg = calls_msg
+    else:
+         home.logger.debug(calls_msg, extra={"action": "cycle"})
+    return cycle_calls
+
+def wait_next_cycle(home: TadoHome, interval: float):
+    """
+    Sleeps for interval unless a trigger arrives. A triggered cycle starts no sooner
+    than triggerMinInterval after the previous one (nor inside a 429 block); triggers
+    arriving in the meantime are coalesced into it. While the daily budget or Tado's
+    quota stretches the interval beyond checkingInterval there is no room for extra
+    cycles, so triggers are deferred to the regular one.
+    """
+    deadline = time.monotonic() + interval
+    if not home.wake.wait(interval):
+        return
+    if interval > checkingInterval:
+        home.logger.debug("Trigger received. Deferred to the next regular cycle (API budget).")
+        time.sleep(max(0.0, deadline - time.monotonic()))
+        home.wake.clear()
+        return
+    hold = max(triggerMinInterval - (time.monotonic() - home.cycleStartedAt), home.budget.retry_interval(0))
+    hold = min(hold, deadline - time.monotonic())
+    if hold > 0:
+        home.logger.debug(f"Trigger received. Next cycle in {hold:.1f}s (rate limit).")
+        time.sleep(hold)
+    home.wake.clear()
+    home.count("tado_triggered_cycles_total")
+    home.logger.info("Triggered cycle.", extra={"action": "trigger"})
+
+def engine_loop(home: TadoHome, executor, owdActivated: set):
+    """Runs monitoring cycles until re-initialization is required."""
+    last_interval = checkingInterval
+    auth_errors = 0
     while True:
         try:
-            # Open Window Detection (OWD)
-            zones = t.get_zones()
-            if zones:
-                 for z in zones:
-                     zoneID = z.get("id")
-                     zoneName = z.get("name", f"Zone {zoneID}")
-                     if not zoneID:
-                          logger.warning("Zone with no ID.")
-                          continue
-                     try:
-                         owd_info = t.get_open_window_detected(zoneID)
-                         if owd_info.get("openWindowDetected"):
-                              zone_state = t.get_state(zoneID)
-                              if not zone_state.get("openWindow"):
-                                   printm(f"{zoneName}: OWD detected -> activating.")
-                                   t.set_open_window(zoneID)
-                                   printm(f"{zoneName}: OWD activated.")
-                     except TadoException as e:
-                          if "Open window" not in lastMessage:
-                               printm(f"Error OWD {zoneName}: {e}")
-                     except KeyError as e:
-                          logger.warning(f"KeyError OWD {zoneName}: {e}")
-            # Geofencing
-            homeState = t.get_home_state()["presence"]
-            currentDevicesHome = []
-            mobile_devices = t.get_mobile_devices()
-            if mobile_devices:
-                for mobileDevice in mobile_devices:
-                     dev_name = mobileDevice.get("name", f"Dev_{mobileDevice.get('id', 'Unk')}")
-                     if mobileDevice.get("settings", {}).get("geoTrackingEnabled"):
-                         if mobileDevice.get("location") and mobileDevice["location"].get("atHome"):
-                              currentDevicesHome.append(dev_name)
-            num_home = len(currentDevicesHome)
-            dev_str = ", ".join(currentDevicesHome) if num_home > 0 else "none"
-            if num_home > 0 and homeState == "AWAY":
-                 printm(f"Devices ({dev_str}) home, but AWAY -> HOME.")
-                 t.set_home()
-                 printm("HOME activated.")
-                 last_presence_check_msg = ""
-                 printm("Waiting...")
-            elif num_home == 0 and homeState == "HOME":
-                 printm(f"No devices home, but HOME -> AWAY.")
-                 t.set_away()
-                 printm("AWAY activated.")
-                 last_presence_check_msg = ""
-                 printm("Waiting...")
-            else:
-                 current_msg = f"Presence: {num_home} home ({dev_str}), Mode: {homeState}. No change."
-                 if current_msg != last_presence_check_msg:
-                      if "No change" not in last_presence_check_msg:
-                           logger.info(current_msg)
-                      else:
-                           logger.debug(current_msg)
-                      last_presence_check_msg = current_msg
-            time.sleep(checkingInterval)
+            if sessionReuse and home.breakers["auth"].remaining() == 0 and not refresh_session(home):
+                 printm("Token refresh rejected. Re-init required.", home)
+                 close_session(home)
+                 break
+            cycle_calls = engine_cycle(home, executor, owdActivated)
+            auth_errors = 0
+            home.backoff.reset()
+            interval = home.budget.next_interval(cycle_calls)
+            if abs(interval - last_interval) > 0.1 * last_interval:
+                 budget = home.budget.stats()
+                 home.logger.info(f"Polling interval {interval:.1f}s (API calls today: {budget['used_today']}"
+                                  f"/{budget['daily_budget'] or budget['quota'] or 'unlimited'}"
+                                  f", Tado quota left: {budget['quota_remaining'] if budget['quota_remaining'] is not None else 'unknown'}).")
+                 last_interval = interval
+            wait_next_cycle(home, interval)
         except TadoCredentialsException as e:
-             printm(f"CRITICAL Auth Error: {e}. Re-init required.")
+             home.record_error(e)
+             home.cache.invalidate()
+             auth_errors += 1
+             if sessionReuse and auth_errors <= TOKEN_RECOVERY_ATTEMPTS and recover_session(home):
+                  continue
+             printm(f"CRITICAL Auth Error: {e}. Re-init required.", home)
+             close_session(home)
              break
         except TadoException as e:
-             printm(f"API Error: {e}. Retrying in {errorRetringInterval}s.")
-             time.sleep(errorRetringInterval)
+             home.record_error(e)
+             home.cache.invalidate()
+             retry_in = retry_delay(home)
+             # The jittered delay stays out of the message so repeats are deduplicated
+             printm(f"API Error: {e}. Retrying...", home, key="error", action="retry")
+             home.logger.debug(f"Next attempt in {retry_in:.1f}s.")
+             time.sleep(retry_in)
         except KeyError as e:
-             logger.error(f"KeyError: {e}", exc_info=True)
-             printm(f"API Resp Error. Retrying...")
-             time.sleep(errorRetringInterval)
+             home.record_error(e)
+             home.cache.invalidate()
+             home.logger.error(f"KeyError: {e}", exc_info=True)
+             printm(f"API Resp Error. Retrying...", home)
+             time.sleep(retry_delay(home))
+        except Exception as e:
+             home.record_error(e)
+             home.cache.invalidate()
+             home.logger.error(f"Unexpected Engine Error: {e}", exc_info=True)
+             printm(f"Unexpected Error. Retrying...", home)
+             time.sleep(retry_delay(home))
+
+def run_home(home: TadoHome):
+    """Runs the initialize -> status check -> engine lifecycle of one home forever."""
+    while True:
+        try:
+            if sessionReuse and home.t is not None and refresh_session(home):
+                 home.logger.info("Reusing the authenticated session. Performing status check...")
+            else:
+                 home.logger.info("Attempting Tado initialization...")
+                 initialize_tado(home)
+                 home.logger.info("Initialization complete. Performing initial status check...")
+            state = load_state(home)
+            if state is not None:
+                 home.logger.info("Fresh saved state found. Skipping initial status check.")
+                 engine(home, state)
+            elif homeStatus(home):
+                 home.logger.info("Initial status check OK. Starting engine.")
+                 engine(home)
+            printm("Engine stopped or initial check failed. Restarting initialization...", home)
         except Exception as e:
-             logger.error(f"Unexpected Engine Error: {e}", exc_info=True)
-             printm(f"Unexpected Error. Retrying...")
-             time.sleep(errorRetringInterval)
+            home.logger.error(f"Unexpected error in home lifecycle: {e}", exc_info=True)
+            close_session(home)
+            home.publish(auth_status=None)
+        time.sleep(5)
+
+def run_in_daemon_thread(loop: asyncio.AbstractEventLoop, func, *args) -> asyncio.Future:
+    """
+    Runs func(*args) on a daemon thread and returns a future for its result. Unlike
+    asyncio.to_thread(), the interpreter does not join the thread at shutdown, so a
+    KeyboardInterrupt is not held up by a lifecycle that never returns.
+    """
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def target():
+        try:
+            result = func(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, result)
+
+    Thread(target=target, name=f"tado-home-{getattr(args[0], 'name', '')}", daemon=True).start()
+    return future
+
+async def run_homes(homes: list[TadoHome]):
+    """Runs every home as an independent task; each blocking lifecycle gets its own daemon thread."""
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(run_in_daemon_thread(loop, run_home, home) for home in homes))
+
+def load_homes(path: str) -> list[TadoHome]:
+    """
+    Loads the homes of a multi-home config file, e.g.
+      {"homes": [{"name": "flat", "token_file": "/data/flat.token",
+                  "username": "me@example.com", "password": "secret"}]}
+    Entries without a name or token file, or with an unusable token dir, are skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    entries = config.get("homes", []) if isinstance(config, dict) else config
+    loaded = []
+    for entry in entries:
+        name = entry.get("name")
+        token_file = entry.get("token_file")
+        if not name or not token_file:
+            logger.error(f"Skipping home entry without name/token_file: {name or 'UNKNOWN'}")
+            continue
+        if any(home.name == name for home in loaded):
+            logger.error(f"Skipping duplicate home name: {name}")
+            continue
+        home = TadoHome(name, token_file, entry.get("username"), entry.get("password"),
+                        int(entry.get("daily_budget", dailyCallBudget)))
+        if prepare_token_dir(home):
+            loaded.append(home)
+    return loaded
 
 def main():
     """Main setup and execution loop."""
-    global checkingInterval, errorRetringInterval, t
+    global checkingInterval, errorRetringInterval, batchZoneStates, zoneWorkers, dailyCallBudget, approvalTimeout, approvalEngine, homes
+    global callTiming, traceFile, cacheTtls, sessionReuse, tokenRefreshMargin, stateMaxAge
+    global backoffMax, breakerThreshold, breakerCooldown, triggerSecret, triggerMinInterval
+    global presenceSamples, presenceDwell, presenceCooldown
     log_level_str = os.getenv("TADO_LOG_LEVEL", default="INFO").upper()
     log_level = getattr(logging, log_level_str, logging.INFO)
     logger.setLevel(log_level)
+    try:
+         log_queue_size = max(0, int(os.getenv("TADO_LOG_QUEUE", default=0)))
+    except ValueError as e:
+         logger.error(f"Invalid TADO_LOG_QUEUE ({e}). Logging synchronously.")
+         log_queue_size = 0
+    setup_logging(log_queue_size, os.getenv("TADO_LOG_FORMAT", default="text").lower() == "json")
     logger.info(f"Log level: {log_level_str}")
     try:
          checkingInterval = float(os.getenv("TADO_CHECK_INTERVAL", default=10.0))
@@ -424,22 +1953,136 @@ def main():
          logger.error(f"Invalid intervals ({e}). Using defaults.")
          checkingInterval = 10.0
          errorRetringInterval = 30.0
+    try:
+         zoneWorkers = max(1, int(os.getenv("TADO_ZONE_WORKERS", default=1)))
+    except ValueError as e:
+         logger.error(f"Invalid TADO_ZONE_WORKERS ({e}). Using 1.")
+         zoneWorkers = 1
+    try:
+         approvalTimeout = float(os.getenv("TADO_APPROVAL_TIMEOUT", default=180.0))
+    except ValueError as e:
+         logger.error(f"Invalid TADO_APPROVAL_TIMEOUT ({e}). Using 180s.")
+         approvalTimeout = 180.0
+    approvalEngine = os.getenv("TADO_APPROVAL_ENGINE", default="auto").lower()
+    if approvalEngine not in ("auto", "http", "browser"):
+         logger.error(f"Invalid TADO_APPROVAL_ENGINE ({approvalEngine}). Using auto.")
+         approvalEngine = "auto"
+    try:
+         dailyCallBudget = max(0, int(os.getenv("TADO_DAILY_CALL_BUDGET", default=0)))
+    except ValueError as e:
+         logger.error(f"Invalid TADO_DAILY_CALL_BUDGET ({e}). Budget disabled.")
+         dailyCallBudget = 0
+    batchZoneStates = os.getenv("TADO_BATCH_ZONE_STATES", default="True").lower() in ("1", "true", "yes")
     logger.info(f"Tado Auto-Assist Starting Up")
     logger.info(f"Check: {checkingInterval:.1f}s, Retry: {errorRetringInterval:.1f}s")
+    logger.info(f"OWD mode: {'batched zoneStates' if batchZoneStates else 'per-zone'}, workers: {zoneWorkers}")
+    callTiming = os.getenv("TADO_CALL_TIMING", default="False").lower() in ("1", "true", "yes")
+    trace_path = os.getenv("TADO_TRACE_FILE")
+    if trace_path:
+         try:
+              traceFile = sys.stdout if trace_path == "-" else open(trace_path, "a", encoding="utf-8", buffering=1)
+              callTiming = True
+         except OSError as e:
+              logger.error(f"Cannot open TADO_TRACE_FILE {trace_path}: {e}. Tracing disabled.")
+    cache_ttl = os.getenv("TADO_CACHE_TTL")
+    if cache_ttl is not None:
+         try:
+              cacheTtls = {endpoint.strip(): float(ttl) for endpoint, ttl in
+                           (item.split("=", 1) for item in cache_ttl.split(",") if item.strip())}
+         except ValueError as e:
+              logger.error(f"Invalid TADO_CACHE_TTL ({e}). Using {cacheTtls}.")
+    sessionReuse = os.getenv("TADO_SESSION_REUSE", default="True").lower() in ("1", "true", "yes")
+    try:
+         tokenRefreshMargin = max(0.0, float(os.getenv("TADO_TOKEN_REFRESH_MARGIN", default=120.0)))
+    except ValueError as e:
+         logger.error(f"Invalid TADO_TOKEN_REFRESH_MARGIN ({e}). Using 120s.")
+         tokenRefreshMargin = 120.0
+    try:
+         stateMaxAge = max(0.0, float(os.getenv("TADO_STATE_MAX_AGE", default=300.0)))
+    except ValueError as e:
+         logger.error(f"Invalid TADO_STATE_MAX_AGE ({e}). Using 300s.")
+         stateMaxAge = 300.0
+    try:
+         backoffMax = max(errorRetringInterval, float(os.getenv("TADO_BACKOFF_MAX", default=600.0)))
+         breakerThreshold = int(os.getenv("TADO_BREAKER_THRESHOLD", default=5))
+         breakerCooldown = max(1.0, float(os.getenv("TADO_BREAKER_COOLDOWN", default=60.0)))
+    except ValueError as e:
+         logger.error(f"Invalid backoff/breaker settings ({e}). Using defaults.")
+         backoffMax, breakerThreshold, breakerCooldown = max(errorRetringInterval, 600.0), 5, 60.0
+    triggerSecret = os.getenv("TADO_TRIGGER_SECRET") or None
+    try:
+         triggerMinInterval = max(0.0, float(os.getenv("TADO_TRIGGER_MIN_INTERVAL", default=5.0)))
+    except ValueError as e:
+         logger.error(f"Invalid TADO_TRIGGER_MIN_INTERVAL ({e}). Using 5s.")
+         triggerMinInterval = 5.0
+    try:
+         presenceSamples = max(1, int(os.getenv("TADO_PRESENCE_SAMPLES", default=2)))
+         presenceDwell = max(0.0, float(os.getenv("TADO_PRESENCE_DWELL", default=0.0)))
+         presenceCooldown = max(0.0, float(os.getenv("TADO_PRESENCE_COOLDOWN", default=60.0)))
+    except ValueError as e:
+         logger.error(f"Invalid presence debounce settings ({e}). Using defaults.")
+         presenceSamples, presenceDwell, presenceCooldown = 2, 0.0, 60.0
+    logger.info(f"Approval engine: {approvalEngine}")
+    logger.info(f"Presence switch after {presenceSamples} poll(s) and {presenceDwell:.0f}s, "
+                f"{presenceCooldown:.0f}s cooldown after each write")
+    logger.info(f"Triggers: POST /trigger ({'shared secret' if triggerSecret else 'no secret'}) and SIGUSR1, "
+                f"at most every {triggerMinInterval:.0f}s")
+    logger.info(f"Backoff: {errorRetringInterval:.0f}s..{backoffMax:.0f}s, circuit breakers: "
+                f"{f'{breakerThreshold} failures, {breakerCooldown:.0f}s cooldown' if breakerThreshold > 0 else 'disabled'}")
+    logger.info(f"Warm restart: {f'state younger than {stateMaxAge:.0f}s' if stateMaxAge else 'disabled'}")
+    if sessionReuse:
+         logger.info(f"Session reuse enabled. Token refresh {tokenRefreshMargin:.0f}s before expiry.")
+    logger.info(f"Metadata cache TTLs: {cacheTtls or 'disabled'}")
+    if callTiming:
+         logger.info(f"API call timing enabled. Trace: {trace_path if traceFile else 'metrics only'}")
+    logger.info(f"Daily API call budget: {dailyCallBudget or 'none (Tado rate-limit headers only)'}")
+    homes_file = os.getenv("TADO_HOMES_FILE")
+    if homes_file:
+        try:
+            homes = load_homes(homes_file)
+        except (OSError, ValueError, AttributeError) as e:
+            logger.critical(f"Cannot load homes file {homes_file}: {e}")
+            sys.exit(1)
+        if not homes:
+            logger.critical(f"No usable homes in {homes_file}.")
+            sys.exit(1)
+        logger.info(f"Multi-home mode: {', '.join(home.name for home in homes)}")
+    else:
+        token_file_path = os.getenv("TADO_TOKEN_FILE")
+        if not token_file_path:
+            logger.critical("TADO_TOKEN_FILE env var missing.")
+            sys.exit(1)
+        home = TadoHome("", token_file_path, os.getenv("TADO_USERNAME"), os.getenv("TADO_PASSWORD"), dailyCallBudget)
+        if not prepare_token_dir(home):
+            sys.exit(1)
+        homes = [home]
+    signal.signal(signal.SIGUSR1, handle_sigusr1)
     health_thread = Thread(target=health_check_server, daemon=True)
     health_thread.start()
-    while True:
-        logger.info("Attempting Tado initialization...")
-        t = initialize_tado()
-        logger.info("Initialization complete. Performing initial status check...")
-        if homeStatus():
-             logger.info("Initial status check OK. Starting engine.")
-             engine()
-        printm("Engine stopped or initial check failed. Restarting initialization...")
-        t = None
-        time.sleep(5)
+    if len(homes) == 1:
+        run_home(homes[0])
+    else:
+        asyncio.run(run_homes(homes))
+
+def approval_worker_main(url: str, user_code: str) -> int:
+    """Entry point of the child process started by run_approval_worker()."""
+    global browserTimeout, browserScreenshots
+    log_level_str = os.getenv("TADO_LOG_LEVEL", default="INFO").upper()
+    logger.setLevel(getattr(logging, log_level_str, logging.INFO))
+    # Same stdout stream as the daemon, so the same line format (no queue for a short-lived process)
+    setup_logging(json_format=os.getenv("TADO_LOG_FORMAT", default="text").lower() == "json")
+    try:
+         browserTimeout = float(os.getenv("TADO_BROWSER_TIMEOUT", default=20.0))
+    except ValueError as e:
+         logger.error(f"Invalid TADO_BROWSER_TIMEOUT ({e}). Using 20s.")
+         browserTimeout = 20.0
+    browserScreenshots = os.getenv("TADO_BROWSER_SCREENSHOTS", default="False").lower() in ("1", "true", "yes")
+    approved = automate_tado_approval(url, user_code, os.getenv("TADO_USERNAME"), os.getenv("TADO_PASSWORD"))
+    return 0 if approved else 1
 
 if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--approve":
+         sys.exit(approval_worker_main(sys.argv[2], sys.argv[3]))
     try:
          main()
     except KeyboardInterrupt:
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# benchmark.py (Tado Auto-Assist - engine benchmark against the offline simulator)
+#
+# Example:
+#   python benchmark.py --homes 4 --zones 12 --devices 5 --cycles 200 --latency 0.05 --workers 8
+#
+# Runs initialize_tado(), homeStatus() and engine cycles of app.py for every
+# simulated home in its own thread (like TADO_HOMES_FILE mode) and reports API
+# calls per cycle, cycle latency percentiles, CPU and memory per home.
+
+import argparse
+import functools
+import json
+import logging
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+import app
+from tado_sim import SimTado
+from PyTado.exceptions import TadoException, TadoCredentialsException
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of values (0 if empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+def sim_calls(home: app.TadoHome) -> int:
+    return sum(home.t.calls.values()) if home.t is not None else 0
+
+def recover(home: app.TadoHome) -> int:
+    """Handles an auth error like engine_loop() does; returns the API requests it cost."""
+    t, before = home.t, sim_calls(home)
+    if not (app.sessionReuse and app.recover_session(home)):
+        app.close_session(home)
+        app.initialize_tado(home)
+        home.t.on_response = home.budget.record
+    return sim_calls(home) - (before if home.t is t else 0)
+
+def bench_home(home: app.TadoHome, args, result: dict):
+    """Initializes one simulated home and runs args.cycles engine cycles."""
+    cpu_start = time.thread_time()
+    started = time.perf_counter()
+    app.initialize_tado(home)
+    result["init_s"] = time.perf_counter() - started
+    home.t.on_response = home.budget.record
+    owdActivated = set()
+    startup_calls = sim_calls(home)
+    started = time.perf_counter()
+    # Like run_home(): a fresh saved state replaces the initial status check
+    state = app.load_state(home)
+    result["warm_start"] = state is not None
+    if state is not None:
+        app.apply_state(home, state, owdActivated)
+    else:
+        result["home_status_ok"] = app.homeStatus(home)
+    result["home_status_s"] = time.perf_counter() - started
+
+    executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="bench-zone") if args.workers > 1 else None
+    durations, calls, errors, allocs = [], [], {}, []
+    recoveries, recovery_calls = [], []
+    # reset_peak() is process-wide: other homes' threads would reset each other's peak
+    trace_cycles = args.trace_alloc and args.homes == 1
+    try:
+        for cycle in range(args.cycles):
+            if trace_cycles:
+                # Peak memory allocated during the cycle
+                tracemalloc.reset_peak()
+                traced_before = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            try:
+                calls.append(app.engine_cycle(home, executor, owdActivated))
+            except (TadoException, KeyError) as e:
+                errors[e.__class__.__name__] = errors.get(e.__class__.__name__, 0) + 1
+                if isinstance(e, TadoCredentialsException):
+                    started = time.perf_counter()
+                    recovery_calls.append(recover(home))
+                    recoveries.append(time.perf_counter() - started)
+                continue
+            durations.append(time.perf_counter() - started)
+            if trace_cycles:
+                allocs.append(tracemalloc.get_traced_memory()[1] - traced_before)
+            if cycle == 0:
+                # Status check (or warm restart) plus the first cycle
+                result["startup_calls"] = sim_calls(home) - startup_calls
+    finally:
+        if executor:
+            executor.shutdown()
+    result.update(
+        cycles_ok=len(durations),
+        errors=errors,
+        calls_per_cycle=sum(calls) / len(calls) if calls else 0.0,
+        sim_calls=sim_calls(home),
+        recoveries=len(recoveries),
+        recovery_ms=sum(recoveries) * 1000 / len(recoveries) if recoveries else 0.0,
+        recovery_calls=sum(recovery_calls) / len(recovery_calls) if recovery_calls else 0.0,
+        p50_ms=percentile(durations, 50) * 1000,
+        p90_ms=percentile(durations, 90) * 1000,
+        p99_ms=percentile(durations, 99) * 1000,
+        max_ms=max(durations, default=0.0) * 1000,
+        alloc_kb_per_cycle=sum(allocs) / 1024 / len(allocs) if allocs else None,
+        # Engine-thread CPU only; zone worker threads are not included
+        cpu_ms_per_cycle=(time.thread_time() - cpu_start) * 1000 / max(1, args.cycles),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app.py's engine against the offline Tado simulator.")
+    parser.add_argument("--homes", type=int, default=1)
+    parser.add_argument("--zones", type=int, default=8)
+    parser.add_argument("--devices", type=int, default=3)
+    parser.add_argument("--cycles", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per simulated API call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--errors", default="tado,401,429", help="injected error kinds: tado,401,429")
+    parser.add_argument("--churn", type=float, default=0.01, help="chance of a window/device flip per fetch")
+    parser.add_argument("--device-flow", choices=("completed", "pending"), default="completed")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After of simulated 429s (seconds)")
+    parser.add_argument("--quota", type=int, default=None, help="daily quota reported in RateLimit headers")
+    parser.add_argument("--token-lifetime", type=float, default=600.0, help="simulated access token lifetime (seconds)")
+    parser.add_argument("--no-session-reuse", action="store_true", help="TADO_SESSION_REUSE=False")
+    parser.add_argument("--state-max-age", type=float, default=0.0,
+                        help="TADO_STATE_MAX_AGE; run twice to compare a cold and a warm start")
+    parser.add_argument("--breaker-threshold", type=int, default=5, help="TADO_BREAKER_THRESHOLD (0 disables)")
+    parser.add_argument("--breaker-cooldown", type=float, default=0.1, help="TADO_BREAKER_COOLDOWN (seconds)")
+    parser.add_argument("--workers", type=int, default=1, help="TADO_ZONE_WORKERS")
+    parser.add_argument("--per-zone", action="store_true", help="TADO_BATCH_ZONE_STATES=False")
+    parser.add_argument("--call-timing", action="store_true", help="TADO_CALL_TIMING=True")
+    parser.add_argument("--trace", default=None, help="TADO_TRACE_FILE (JSON lines, '-' for stdout)")
+    parser.add_argument("--cache-ttl", default=None, help="TADO_CACHE_TTL, e.g. zones=0 to disable caching")
+    parser.add_argument("--trace-alloc", action="store_true",
+                        help="trace allocations with tracemalloc (slows the cycles: compare timings without it)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    app.logger.setLevel(getattr(logging, args.log_level.upper(), logging.WARNING))
+    app.batchZoneStates = not args.per_zone
+    app.zoneWorkers = args.workers
+    app.errorRetringInterval = 0.01
+    app.backoffMax = 0.5
+    app.breakerThreshold = args.breaker_threshold
+    app.breakerCooldown = args.breaker_cooldown
+    app.sessionReuse = not args.no_session_reuse
+    app.stateMaxAge = args.state_max_age
+    app.callTiming = args.call_timing or bool(args.trace)
+    if args.cache_ttl is not None:
+        app.cacheTtls = {endpoint: float(ttl) for endpoint, ttl in
+                         (item.split("=", 1) for item in args.cache_ttl.split(",") if item.strip())}
+    if args.trace:
+        app.traceFile = sys.stdout if args.trace == "-" else open(args.trace, "a", encoding="utf-8", buffering=1)
+    app.Tado = functools.partial(
+        SimTado, zones=args.zones, devices=args.devices, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, errors=tuple(args.errors.split(",")), churn=args.churn,
+        device_flow=args.device_flow, quota=args.quota, token_lifetime=args.token_lifetime,
+        retry_after=args.retry_after, seed=args.seed)
+
+    homes = [app.TadoHome(f"sim{i}", f"/tmp/tado_sim_{i}.token") for i in range(args.homes)]
+    app.homes = homes
+    results = {home.name: {} for home in homes}
+    if args.trace_alloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    threads = [Thread(target=bench_home, args=(home, args, results[home.name])) for home in homes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    traced_peak = None
+    if args.trace_alloc:
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    summary = {
+        "homes": args.homes, "zones": args.zones, "devices": args.devices, "cycles": args.cycles,
+        "mode": "per-zone" if args.per_zone else "batched", "workers": args.workers,
+        "wall_s": wall,
+        "traced_peak_kb_per_home": traced_peak / 1024 / args.homes if traced_peak is not None else None,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "homes_detail": results,
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{args.homes} home(s), {args.zones} zones, {args.devices} devices, {args.cycles} cycles, "
+          f"{summary['mode']} OWD, {args.workers} worker(s), latency {args.latency * 1000:.0f} ms")
+    print(f"{'home':<8}{'calls/cyc':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'cpu ms/cyc':>11}{'alloc KiB':>10}{'init ms':>9}{'start req':>10}{'recov ms':>10}{'recov req':>10}  errors")
+    for name, r in results.items():
+        print(f"{name:<8}{r['calls_per_cycle']:>10.2f}{r['p50_ms']:>9.2f}{r['p90_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['max_ms']:>9.2f}{r['cpu_ms_per_cycle']:>11.3f}"
+              f"{'-' if r['alloc_kb_per_cycle'] is None else format(r['alloc_kb_per_cycle'], '.1f'):>10}{r['init_s'] * 1000:>9.1f}"
+              f"{str(r.get('startup_calls', '-')) + (' (warm)' if r['warm_start'] else ''):>10}{r['recovery_ms']:>10.1f}{r['recovery_calls']:>10.2f}  {r['errors'] or '-'}")
+    traced = (f", traced peak {summary['traced_peak_kb_per_home']:.0f} KiB/home"
+              if summary["traced_peak_kb_per_home"] is not None else "")
+    print(f"wall {wall:.2f}s{traced}, max RSS {summary['max_rss_mb']:.1f} MB")
+
+if __name__ == "__main__":
+    sys.exit(main())
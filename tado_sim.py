@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+# tado_sim.py (Tado Auto-Assist - offline stand-in for the Tado API, used by benchmark.py)
+
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+from PyTado.http import DeviceActivationStatus
+from PyTado.exceptions import TadoException, TadoCredentialsException
+
+class SimHttp:
+    """
+    Token handling of PyTado's Http object as used by app.py: the access token
+    expires after `token_lifetime` seconds and _refresh_token() costs one
+    oauth2/token call. Has no requests session.
+    """
+    def __init__(self, sim: "SimTado", user_code: str | None, token_lifetime: float):
+        self.sim = sim
+        self.user_code = user_code
+        self.token_lifetime = token_lifetime
+        self._refresh_at = datetime.now(timezone.utc) + timedelta(seconds=token_lifetime)
+
+    def _refresh_token(self, refresh_token: str | None = None, force_refresh: bool = False) -> bool:
+        if self._refresh_at >= datetime.now(timezone.utc) and not force_refresh:
+            return True
+        try:
+            self.sim._call("oauth2/token")
+        except TadoCredentialsException:
+            if force_refresh:
+                return False
+            raise
+        self._refresh_at = datetime.now(timezone.utc) + timedelta(seconds=self.token_lifetime)
+        return True
+
+class SimTado:
+    """
+    In-memory stand-in for PyTado's Tado object, returning the same dict payloads
+    app.py works with. Every API method sleeps for the configured latency, may fail
+    with an injected error and is counted per endpoint.
+
+      zones / devices  home size
+      latency, jitter  seconds added to every API call
+      error_rate       probability that a call fails with one of `errors`:
+                       "tado" (TadoException), "401" (TadoCredentialsException),
+                       "429" (rate limited, with a `retry_after` seconds Retry-After header)
+      churn            probability per zone/device and fetch that its OWD or
+                       atHome state flips
+      device_flow      "completed" (token OK) or "pending" (device_activation()
+                       completes after `pending_polls` simulated polls)
+      quota            daily request quota reported in RateLimit headers (None: no headers)
+      token_lifetime   seconds until the access token must be refreshed; creating
+                       the object with a saved token costs a refresh, /me and a
+                       home lookup, like PyTado
+      on_response      callback(url, status_code, headers) fired for every call,
+                       e.g. ApiBudget.record
+    """
+    def __init__(self, token_file_path: str | None = None, debug: bool = False, *, zones: int = 4,
+                 devices: int = 2, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 errors: tuple = ("tado", "401", "429"), churn: float = 0.0, device_flow: str = "completed",
+                 pending_polls: int = 1, quota: int | None = None, token_lifetime: float = 600.0, retry_after: int = 60,
+                 on_response=None, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.errors = errors
+        self.churn = churn
+        self.pending_polls = pending_polls
+        self.quota = quota
+        self.quota_remaining = quota
+        self.retry_after = retry_after
+        self.on_response = on_response
+        self.calls: dict[str, int] = {}
+        self.lock = Lock()
+        self.random = random.Random(seed)
+        self.presence = "HOME"
+        self.zone_states = {
+            str(zone_id): {"openWindowDetected": False, "openWindow": None}
+            for zone_id in range(1, zones + 1)
+        }
+        self.devices = [
+            {"id": device_id, "name": f"Phone {device_id}",
+             "settings": {"geoTrackingEnabled": True}, "location": {"atHome": device_id == 1}}
+            for device_id in range(1, devices + 1)
+        ]
+        if device_flow == "pending":
+            self.status = DeviceActivationStatus.PENDING
+            self._http = SimHttp(self, "SIMCODE", token_lifetime)
+        else:
+            self.status = DeviceActivationStatus.COMPLETED
+            self._http = SimHttp(self, None, token_lifetime)
+            for endpoint in ("oauth2/token", "me", "homes/1"):
+                self._call(endpoint)
+
+    # --- Simulation helpers ---
+    def _call(self, endpoint: str):
+        """Counts, delays and possibly fails one API call."""
+        if endpoint != "oauth2/token":
+            self._http._refresh_token()
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            failure = self.random.choice(self.errors) if self.random.random() < self.error_rate else None
+            if self.quota_remaining is not None:
+                self.quota_remaining = max(0, self.quota_remaining - 1)
+            headers = {}
+            if self.quota is not None:
+                headers["RateLimit-Policy"] = f'"perday";q={self.quota};w=86400'
+                headers["RateLimit"] = f'"perday";r={self.quota_remaining};t=86400'
+        if delay:
+            time.sleep(delay)
+        url = f"https://my.tado.com/api/v2/homes/1/{endpoint}"
+        if failure == "429" or self.quota_remaining == 0:
+            headers["Retry-After"] = str(self.retry_after)
+            self._respond(url, 429, headers)
+            raise TadoException("Request failed with status code 429")
+        if failure == "401":
+            self._respond(url, 401, headers)
+            raise TadoCredentialsException("Failed to refresh token, probably wrong credentials. Status code: 401")
+        if failure == "tado":
+            self._respond(url, 500, headers)
+            raise TadoException("Request failed with status code 500")
+        self._respond(url, 200, headers)
+
+    def _respond(self, url: str, status_code: int, headers: dict):
+        if self.on_response:
+            self.on_response(url, status_code, headers)
+
+    def _churn(self):
+        """Randomly opens/closes windows and moves devices across the geofence."""
+        if not self.churn:
+            return
+        with self.lock:
+            for state in self.zone_states.values():
+                if self.random.random() < self.churn:
+                    state["openWindowDetected"] = not state["openWindowDetected"]
+                    state["openWindow"] = None
+            for device in self.devices:
+                if self.random.random() < self.churn:
+                    device["location"] = {"atHome": not device["location"]["atHome"]}
+
+    # --- Device flow ---
+    def device_activation_status(self) -> DeviceActivationStatus:
+        return self.status
+
+    def device_verification_url(self) -> str | None:
+        # No URL: the app skips the approval engines and goes straight to polling
+        return None
+
+    def device_activation(self) -> bool:
+        for _ in range(self.pending_polls):
+            self._call("oauth2/token")
+        self.status = DeviceActivationStatus.COMPLETED
+        self._http.user_code = None
+        return True
+
+    # --- API used by app.py ---
+    def get_zones(self) -> list:
+        self._call("zones")
+        return [{"id": int(zone_id), "name": f"Zone {zone_id}"} for zone_id in self.zone_states]
+
+    def get_zone_states(self) -> dict:
+        self._call("zoneStates")
+        self._churn()
+        with self.lock:
+            return {"zoneStates": {zone_id: dict(state) for zone_id, state in self.zone_states.items()}}
+
+    def get_state(self, zone: int) -> dict:
+        self._call(f"zones/{zone}/state")
+        return dict(self.zone_states[str(zone)])
+
+    def get_open_window_detected(self, zone: int) -> dict:
+        self._churn()
+        state = self.get_state(zone)
+        return {"openWindowDetected": state["openWindowDetected"]}
+
+    def set_open_window(self, zone: int) -> dict:
+        self._call(f"zones/{zone}/state/openWindow/activate")
+        with self.lock:
+            self.zone_states[str(zone)]["openWindow"] = {"detectedTime": time.time()}
+        return {"success": True}
+
+    def get_home_state(self) -> dict:
+        self._call("state")
+        return {"presence": self.presence}
+
+    def get_mobile_devices(self) -> list:
+        self._call("mobileDevices")
+        self._churn()
+        with self.lock:
+            return [dict(device) for device in self.devices]
+
+    def set_home(self) -> dict:
+        self._call("presenceLock")
+        self.presence = "HOME"
+        return {"success": True}
+
+    def set_away(self) -> dict:
+        self._call("presenceLock")
+        self.presence = "AWAY"
+        return {"success": True}
@@ -0,0 +1,31 @@
+# Tests for the daily call budget kept across restarts.
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+URL = "https://my.tado.com/api/v2/homes/1/zoneStates"
+
+def test_used_calls_survive_a_restart(tmp_path):
+    path = str(tmp_path / "tado.token.budget")
+    budget = app.ApiBudget(1000, path)
+    for _ in range(7):
+        budget.record(URL, 200, {})
+    budget.next_interval(3)
+    assert app.ApiBudget(1000, path).used_today == 7
+
+def test_count_from_another_day_is_ignored(tmp_path):
+    path = tmp_path / "tado.token.budget"
+    path.write_text(json.dumps({"day": int(time.time() // 86400) - 1, "used_today": 900}))
+    assert app.ApiBudget(1000, str(path)).used_today == 0
+
+def test_no_file_without_a_daily_budget(tmp_path):
+    path = tmp_path / "tado.token.budget"
+    budget = app.ApiBudget(0, str(path))
+    budget.record(URL, 200, {})
+    budget.next_interval(1)
+    assert not path.exists()
@@ -0,0 +1,69 @@
+# Tests for the per-group circuit breakers of engine_cycle() against the offline simulator.
+
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+from tado_sim import SimTado  # noqa: E402
+
+@pytest.fixture
+def home(tmp_path):
+    home = app.TadoHome("test", str(tmp_path / "tado.token"))
+    home.t = SimTado(zones=3, devices=2, seed=1)
+    return home
+
+def half_open(home: app.TadoHome, *groups: str):
+    """Opens the breakers of groups with an expired cooldown, so the next allow() probes."""
+    for group in groups:
+        breaker = home.breakers[group]
+        breaker.state, breaker.open_until, breaker.cooldown = "open", time.monotonic() - 1, 1.0
+
+def test_probe_of_a_group_that_never_ran_is_released(home, monkeypatch):
+    half_open(home, "owd", "presence")
+    get_zone_states = home.t.get_zone_states
+
+    def outage():
+        monkeypatch.setattr(home.t, "get_zone_states", get_zone_states)
+        raise requests.exceptions.ConnectionError("network down")
+
+    monkeypatch.setattr(home.t, "get_zone_states", outage)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        app.engine_cycle(home, None, set())
+    presence = home.breakers["presence"]
+    assert presence.state == "half_open" and not presence.probing
+    assert home.t.calls.get("mobileDevices", 0) == 0
+
+    # The failed owd probe reopened its breaker; presence is probed on the next cycle
+    assert home.breakers["owd"].state == "open"
+    app.engine_cycle(home, None, set())
+    assert home.t.calls["mobileDevices"] == 1
+    assert presence.state == "closed"
+
+def test_one_failing_zone_does_not_open_the_owd_breaker(home, monkeypatch):
+    monkeypatch.setattr(app, "batchZoneStates", False)
+    get_open_window_detected = home.t.get_open_window_detected
+
+    def broken_zone(zone):
+        if zone == 2:
+            raise app.TadoException("zone 2 broken")
+        return get_open_window_detected(zone)
+
+    monkeypatch.setattr(home.t, "get_open_window_detected", broken_zone)
+    for _ in range(app.breakerThreshold + 1):
+        app.engine_cycle(home, None, set())
+    assert home.breakers["owd"].state == "closed"
+
+def test_zone_errors_are_counted_once_when_every_zone_fails(home, monkeypatch):
+    monkeypatch.setattr(app, "batchZoneStates", False)
+
+    def broken_zone(zone):
+        raise app.TadoException(f"zone {zone} broken")
+
+    monkeypatch.setattr(home.t, "get_open_window_detected", broken_zone)
+    app.engine_cycle(home, None, set())
+    assert home.metrics[("tado_errors_total", "TadoException")] == 3
@@ -0,0 +1,120 @@
+# Tests for the browser-free HTTP approval engine against a local stand-in of
+# Tado's device-code and login pages.
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+USER_CODE = "ABC123"
+USERNAME = "me@example.com"
+PASSWORD = "secret"
+
+DEVICE_PAGE = """<html><body>
+<form id="device-form" action="/device/confirm" method="post">
+  <input type="hidden" name="_csrf" value="csrf-1">
+  <input type="text" name="user_code" value="">
+  <button type="submit" name="action" value="confirm">Submit</button>
+  <button type="submit" name="action" value="deny">Deny</button>
+</form>
+</body></html>"""
+
+LOGIN_PAGE = """<html><body>
+<form action="/login" method="post">
+  <input type="hidden" name="state" value="state-1">
+  <input type="email" name="loginId" value="">
+  <input type="password" name="password" value="">
+  <input type="checkbox" name="remember" value="yes">
+  <button type="submit" name="login" value="true">Sign in</button>
+</form>
+</body></html>"""
+
+class StandIn(BaseHTTPRequestHandler):
+    """Device-code and login pages; every POST is recorded on the server."""
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str = "", headers: dict | None = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body.encode())))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def _cookie_ok(self) -> bool:
+        return "sid=session-1" in (self.headers.get("Cookie") or "")
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/device":
+            self._send(200, DEVICE_PAGE, {"Set-Cookie": "sid=session-1; Path=/"})
+        elif path == "/login" and self._cookie_ok():
+            self._send(200, LOGIN_PAGE)
+        else:
+            self._send(403, "no session")
+
+    def do_POST(self):
+        fields = {name: values[0] for name, values in
+                  parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()).items()}
+        path = urlsplit(self.path).path
+        self.server.posts.append((path, fields, self._cookie_ok()))
+        if not self._cookie_ok():
+            self._send(403, "no session")
+        elif path == "/device/confirm":
+            self._send(302, headers={"Location": "/login"})
+        elif path == "/login" and fields.get("loginId") == USERNAME and fields.get("password") == PASSWORD:
+            self._send(200, "<html><body>Device connected.</body></html>")
+        else:
+            self._send(200, LOGIN_PAGE)
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    httpd.posts = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def url(server, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+def make_home(password: str = PASSWORD) -> app.TadoHome:
+    return app.TadoHome("test", "/tmp/test_http_approval.token", username=USERNAME, password=password)
+
+def test_find_form_collects_submitted_values():
+    form = app.find_form(DEVICE_PAGE, form_id="device-form")
+    assert form["action"] == "/device/confirm"
+    assert form["method"] == "post"
+    # Hidden fields are kept, only the first submit button is sent
+    assert form["fields"] == {"_csrf": "csrf-1", "user_code": "", "action": "confirm"}
+
+def test_find_form_by_field_skips_unchecked_boxes():
+    form = app.find_form(DEVICE_PAGE + LOGIN_PAGE, field="loginId")
+    assert form["fields"] == {"state": "state-1", "loginId": "", "password": "", "login": "true"}
+    assert app.find_form(DEVICE_PAGE, field="loginId") is None
+
+def test_approval_submits_both_forms(server):
+    assert app.http_tado_approval(make_home(), url(server, f"/device?user_code={USER_CODE}"), USER_CODE)
+    (device_path, device_fields, device_cookie), (login_path, login_fields, login_cookie) = server.posts
+    assert device_path == "/device/confirm" and device_cookie
+    assert device_fields == {"_csrf": "csrf-1", "user_code": USER_CODE, "action": "confirm"}
+    assert login_path == "/login" and login_cookie
+    assert login_fields == {"state": "state-1", "loginId": USERNAME, "password": PASSWORD, "login": "true"}
+
+def test_approval_rejects_wrong_credentials(server):
+    assert not app.http_tado_approval(make_home("wrong"), url(server, "/device"), USER_CODE)
+    assert [path for path, _, _ in server.posts] == ["/device/confirm", "/login"]
+
+def test_approval_without_credentials_makes_no_requests(server):
+    assert not app.http_tado_approval(make_home(None), url(server, "/device"), USER_CODE)
+    assert server.posts == []
@@ -0,0 +1,26 @@
+# Tests for the zone and device records kept between cycles.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+def device(device_id: int, name: str, at_home: bool = True) -> dict:
+    return {"id": device_id, "name": name, "settings": {"geoTrackingEnabled": True},
+            "location": {"atHome": at_home}}
+
+def test_renamed_device_rebuilds_devices_home(tmp_path):
+    home = app.TadoHome("test", str(tmp_path / "tado.token"))
+    assert app.update_devices(home, [device(1, "Phone"), device(2, "Tablet", at_home=False)])
+    assert not app.update_devices(home, [device(1, "Phone"), device(2, "Tablet", at_home=False)])
+    assert app.update_devices(home, [device(1, "Work phone"), device(2, "Tablet", at_home=False)])
+    assert home.devicesHome == ["Work phone"]
+
+def test_renamed_zone_keeps_its_record(tmp_path):
+    home = app.TadoHome("test", str(tmp_path / "tado.token"))
+    record = app.index_zones(home, [{"id": 1, "name": "Kitchen"}])["1"]
+    record.detected = True
+    renamed = app.index_zones(home, [{"id": 1, "name": "Dining room"}])["1"]
+    assert renamed is record
+    assert renamed.name == "Dining room" and renamed.detected